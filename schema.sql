@@ -44,7 +44,11 @@ CREATE TABLE IF NOT EXISTS facts (
 );
 
 CREATE INDEX IF NOT EXISTS idx_facts_timestamp ON facts(timestamp);
-CREATE INDEX IF NOT EXISTS idx_facts_transcription ON facts(transcription_id);
+-- Composite: фильтр по transcription_id + ORDER BY timestamp — index range scan без сортировки.
+-- Левый префикс покрывает и запросы только по transcription_id.
+CREATE INDEX IF NOT EXISTS idx_facts_transcription_timestamp ON facts(transcription_id, timestamp);
+-- Старый одноколоночный индекс избыточен (левый префикс composite) — удаляем на существующих БД.
+DROP INDEX IF EXISTS idx_facts_transcription;
 
 -- Таблица для метаданных дайджестов
 CREATE TABLE IF NOT EXISTS digests (
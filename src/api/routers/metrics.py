@@ -1,7 +1,10 @@
 """Роутер для метрик системы."""
+import asyncio
 import json
 from datetime import datetime
 from pathlib import Path
+from typing import Any
+
 from fastapi import APIRouter, Request, Response
 from slowapi import Limiter
 from slowapi.util import get_remote_address
@@ -15,6 +18,33 @@ router = APIRouter(prefix="/metrics", tags=["metrics"])
 limiter = Limiter(key_func=get_remote_address)
 
 
+def _read_database_counts(db_path: Path) -> dict:
+    """Синхронно считает строки в transcriptions/facts/ingest_queue.
+
+    ПОЧЕМУ отдельная sync-функция: sqlite3 блокирующий, а handlers — async.
+    Вызов через asyncio.to_thread не держит event loop на время COUNT(*)
+    по большим таблицам — остальные запросы обслуживаются параллельно.
+    """
+    db = get_reflexio_db(db_path)
+    # Статусы очереди: почему 0 транскрипций при наличии WAV в uploads
+    return {
+        "transcriptions_count": db.fetchone("SELECT COUNT(*) FROM transcriptions")[0],
+        "facts_count": db.fetchone("SELECT COUNT(*) FROM facts")[0],
+        "ingest_queue_pending": db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'pending'")[0],
+        "ingest_queue_processed": db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'processed'")[0],
+        "ingest_queue_error": db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'error'")[0],
+        "ingest_queue_filtered": db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'filtered'")[0],
+    }
+
+
+def _read_fact_counts(db_path: Path) -> tuple[int, int]:
+    """Синхронно возвращает (transcriptions_count, facts_count) для Prometheus."""
+    db = get_reflexio_db(db_path)
+    transcriptions_count = db.fetchone("SELECT COUNT(*) FROM transcriptions")[0]
+    facts_count = db.fetchone("SELECT COUNT(*) FROM facts")[0]
+    return transcriptions_count, facts_count
+
+
 @router.get("")
 @limiter.limit("60/minute")
 async def get_metrics(request: Request, response: Response):
@@ -45,7 +75,7 @@ async def get_metrics(request: Request, response: Response):
     }
     ```
     """
-    metrics = {
+    metrics: dict[str, Any] = {
         "timestamp": datetime.utcnow().isoformat(),
         "service": "reflexio",
         "version": "0.1.0",
@@ -76,23 +106,7 @@ async def get_metrics(request: Request, response: Response):
     db_path = settings.STORAGE_PATH / "reflexio.db"
     if db_path.exists():
         try:
-            db = get_reflexio_db(db_path)
-            transcriptions_count = db.fetchone("SELECT COUNT(*) FROM transcriptions")[0]
-            facts_count = db.fetchone("SELECT COUNT(*) FROM facts")[0]
-            # Статусы очереди: почему 0 транскрипций при наличии WAV в uploads
-            queue_pending = db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'pending'")[0]
-            queue_processed = db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'processed'")[0]
-            queue_error = db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'error'")[0]
-            queue_filtered = db.fetchone("SELECT COUNT(*) FROM ingest_queue WHERE status = 'filtered'")[0]
-
-            metrics["database"] = {
-                "transcriptions_count": transcriptions_count,
-                "facts_count": facts_count,
-                "ingest_queue_pending": queue_pending,
-                "ingest_queue_processed": queue_processed,
-                "ingest_queue_error": queue_error,
-                "ingest_queue_filtered": queue_filtered,
-            }
+            metrics["database"] = await asyncio.to_thread(_read_database_counts, db_path)
         except Exception:
             metrics["database"] = {"status": "error"}
     
@@ -146,9 +160,7 @@ async def get_prometheus_metrics(request: Request, response: Response):
     db_path = settings.STORAGE_PATH / "reflexio.db"
     if db_path.exists():
         try:
-            db = get_reflexio_db(db_path)
-            transcriptions_count = db.fetchone("SELECT COUNT(*) FROM transcriptions")[0]
-            facts_count = db.fetchone("SELECT COUNT(*) FROM facts")[0]
+            transcriptions_count, facts_count = await asyncio.to_thread(_read_fact_counts, db_path)
 
             prometheus_metrics.append("# HELP reflexio_transcriptions_total Total number of transcriptions")
             prometheus_metrics.append("# TYPE reflexio_transcriptions_total counter")
@@ -7,7 +7,7 @@ import json
 import sqlite3
 import threading
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any, Union, Generator, cast
+from typing import Optional, List, Dict, Any, Union, Generator, Callable, cast
 
 # ПОЧЕМУ graceful import: sqlcipher3 требует нативной libsqlcipher-dev.
 # На dev-машинах без неё — fallback на plain sqlite3 с предупреждением.
@@ -35,6 +35,12 @@ except Exception:
 # WAL mode + busy_timeout + cache — базовый минимум для concurrent access.
 # ──────────────────────────────────────────────
 
+# ПОЧЕМУ 256 вместо дефолтных 128: ingest/digest/persongraph вместе держат
+# больше уникальных запросов на одном соединении — без вытеснения из LRU
+# горячие INSERT'ы не перекомпилируются.
+_CACHED_STATEMENTS = 256
+
+
 def get_connection(db_path: Union[str, Path], *, check_same_thread: bool = False) -> sqlite3.Connection:
     """
     Создаёт SQLite connection с production-grade pragmas.
@@ -51,6 +57,7 @@ def get_connection(db_path: Union[str, Path], *, check_same_thread: bool = False
     # магически управляет транзакциями, что вызывает "ghost transactions"
     # после SELECT — данные невидимы между singleton connections в тестах.
     # С None — каждый statement auto-commits, а транзакции начинаем явно через BEGIN.
+    is_new_file = not Path(db_path).exists()
     sqlcipher_key = os.environ.get("SQLCIPHER_KEY", "")
     if not sqlcipher_key:
         # ПОЧЕМУ файловый fallback: docker restart не перечитывает .env,
@@ -69,6 +76,7 @@ def get_connection(db_path: Union[str, Path], *, check_same_thread: bool = False
                 str(db_path),
                 check_same_thread=check_same_thread,
                 isolation_level=None,
+                cached_statements=_CACHED_STATEMENTS,
             ),
         )
         conn.row_factory = _sqlcipher_module.Row
@@ -76,7 +84,12 @@ def get_connection(db_path: Union[str, Path], *, check_same_thread: bool = False
     else:
         if sqlcipher_key and not _SQLCIPHER_AVAILABLE:
             logger.warning("sqlcipher_unavailable", reason="sqlcipher3 not installed, falling back to plain sqlite3")
-        conn = sqlite3.connect(str(db_path), check_same_thread=check_same_thread, isolation_level=None)
+        conn = sqlite3.connect(
+            str(db_path),
+            check_same_thread=check_same_thread,
+            isolation_level=None,
+            cached_statements=_CACHED_STATEMENTS,
+        )
         conn.row_factory = sqlite3.Row
 
     # ПОЧЕМУ каждый pragma:
@@ -100,12 +113,21 @@ def get_connection(db_path: Union[str, Path], *, check_same_thread: bool = False
     ]
 
     cursor = conn.cursor()
+    if is_new_file:
+        # ПОЧЕМУ только при создании файла: auto_vacuum=INCREMENTAL (retention
+        # возвращает ОС страницы через incremental_vacuum) применяется лишь до
+        # первой таблицы и до journal_mode=WAL; на существующей БД — лишний
+        # round-trip без эффекта.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    result = None
     for pragma_name, pragma_value in pragmas:
-        cursor.execute(f"PRAGMA {pragma_name} = {pragma_value}")  # nosec B608 — hardcoded values, not user input
+        row = cursor.execute(f"PRAGMA {pragma_name} = {pragma_value}").fetchone()  # nosec B608 — hardcoded values, not user input
+        if pragma_name == "journal_mode":
+            result = row
 
-    # Верифицируем WAL (journal_mode SET возвращает результат)
-    result = cursor.execute("PRAGMA journal_mode").fetchone()
-    actual_mode = result[0] if result else "unknown"
+    # Верифицируем WAL: SET journal_mode сам возвращает итоговый режим —
+    # отдельный "PRAGMA journal_mode" на каждом connect не нужен.
+    actual_mode = str(result[0]).lower() if result else "unknown"
     if actual_mode != "wal":
         logger.warning("wal_mode_not_set", expected="wal", actual=actual_mode, db_path=str(db_path))
 
@@ -133,6 +155,9 @@ class ReflexioDB:
 
     _instances: Dict[str, "ReflexioDB"] = {}
     _instances_lock = threading.Lock()
+    # Сериализует первое применение схемы: ALTER-догонялки «проверить колонку →
+    # добавить» из двух потоков иначе гоняются за одну и ту же колонку
+    _schema_lock = threading.Lock()
 
     def __init__(self, db_path: Union[str, Path]) -> None:
         self.db_path = str(db_path)
@@ -154,10 +179,32 @@ class ReflexioDB:
         """Thread-local connection (создаётся лениво)."""
         c = getattr(self._local, "conn", None)
         if c is None:
+            # Каталог файла БД — один раз на новое соединение, не stat() на каждый вызов
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
             c = get_connection(self.db_path)
             self._local.conn = c
+            self._local.schemas = set()
         return c
 
+    def ensure_schema(self, name: str, apply: Callable[[sqlite3.Connection], None]) -> None:
+        """
+        Применяет схему name через apply(conn) один раз на соединение.
+
+        ПОЧЕМУ на соединение, а не на строку пути: кэш по пути переживал
+        удаление или подмену файла — новая БД по тому же пути оставалась без
+        таблиц. Новое соединение (close_conn, сброс синглтона) снова применяет
+        схему; DDL с IF NOT EXISTS на готовой БД идемпотентна.
+        """
+        conn = self.conn
+        ready = getattr(self._local, "schemas", None)
+        if ready is None:
+            ready = self._local.schemas = set()
+        if name in ready:
+            return
+        with self._schema_lock:
+            apply(conn)
+        ready.add(name)
+
     def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
         """Выполняет SQL и возвращает cursor."""
         return self.conn.execute(sql, params)
@@ -197,10 +244,14 @@ class ReflexioDB:
                 inst.close_conn()
 
     @contextmanager
-    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
+    def transaction(self, *, immediate: bool = False) -> Generator[sqlite3.Connection, None, None]:
         """
         Context manager для транзакций: commit при успехе, rollback при ошибке.
 
+        immediate=True — BEGIN IMMEDIATE: write-lock берётся сразу. Нужен для
+        транзакций вида SELECT → INSERT/UPDATE: отложенный BEGIN при апгрейде
+        read→write в WAL получает SQLITE_BUSY мимо busy_timeout.
+
         Usage:
             with db.transaction() as conn:
                 conn.execute("INSERT ...", (...))
@@ -208,7 +259,7 @@ class ReflexioDB:
             # auto-commit
         """
         conn = self.conn
-        conn.execute("BEGIN")
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
         try:
             yield conn
             conn.commit()
@@ -374,6 +425,12 @@ class DatabaseBackend:
     def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Вставляет запись в таблицу."""
         raise NotImplementedError
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """Вставляет несколько записей. По умолчанию — поштучно через insert()."""
+        for row in rows:
+            self.insert(table, row)
+        return len(rows)
     
     def select(self, table: str, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Выбирает записи из таблицы."""
@@ -391,6 +448,9 @@ class DatabaseBackend:
 class SQLiteBackend(DatabaseBackend):
     """Бэкенд для SQLite."""
 
+    # Размер пачки для fetchmany в iter_select
+    FETCH_CHUNK_SIZE = 1024
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.conn = get_connection(db_path)
@@ -422,9 +482,61 @@ class SQLiteBackend(DatabaseBackend):
         self.conn.commit()
         
         return {"id": data.get("id"), **data}
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        Вставляет пачку записей одним executemany в одной транзакции.
+
+        ПОЧЕМУ: insert() коммитит каждую строку — N строк = N fsync.
+        Здесь один подготовленный statement и один commit на всю пачку.
+        Все строки должны иметь одинаковый набор колонок.
+        """
+        if not rows:
+            return 0
+        validate_table_name(table)
+
+        columns = list(rows[0].keys())
+        for col in columns:
+            if not col.replace("_", "").isalnum():
+                raise ValueError(f"Invalid column name: {col}")
+
+        params = []
+        for row in rows:
+            if row.keys() != rows[0].keys():
+                raise ValueError("insert_many requires rows with identical columns")
+            # Конвертируем JSONB в строки для SQLite
+            params.append(
+                [json.dumps(row[col]) if isinstance(row[col], (dict, list)) else row[col] for col in columns]
+            )
+
+        columns_str = ", ".join(columns)
+        placeholders = ", ".join(["?"] * len(columns))
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(f"INSERT INTO {table} ({columns_str}) VALUES ({placeholders})", params)  # nosec B608 — table/columns validated above
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(params)
     
     def select(self, table: str, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Выбирает записи из SQLite."""
+        return list(self.iter_select(table, filters=filters, limit=limit))
+
+    def iter_select(
+        self,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Потоково выбирает записи из SQLite пачками через fetchmany.
+
+        ПОЧЕМУ generator: fetchall() материализует всю выборку дважды
+        (строки sqlite + dict'ы) — пик памяти O(N). Здесь в памяти одна пачка.
+        """
         # Валидация имени таблицы
         validate_table_name(table)
         
@@ -449,21 +561,30 @@ class SQLiteBackend(DatabaseBackend):
             query += f" LIMIT {limit}"
         
         cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        result = []
-        for row in rows:
-            row_dict = dict(row)
-            # Парсим JSON строки
-            for key, value in row_dict.items():
-                if isinstance(value, str) and (key.endswith("segments") or key.endswith("urls") or key.endswith("evidence")):
-                    try:
-                        row_dict[key] = json.loads(value)
-                    except Exception:
-                        pass
-            result.append(row_dict)
-        
-        return result
+
+        # ПОЧЕМУ cursor.description + zip: dict(sqlite3.Row) ищет каждую колонку
+        # по имени (hash lookup на ячейку). Имена колонок одинаковы для всех строк —
+        # берём их один раз, значения читаем позиционно. JSON-колонки тоже
+        # определяются один раз на запрос, а не endswith() на каждую ячейку.
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        json_columns = [
+            col for col in columns
+            if col.endswith("segments") or col.endswith("urls") or col.endswith("evidence")
+        ]
+
+        chunk_size = chunk_size or self.FETCH_CHUNK_SIZE
+        while rows := cursor.fetchmany(chunk_size):
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                # Парсим JSON строки
+                for key in json_columns:
+                    value = row_dict[key]
+                    if isinstance(value, str):
+                        try:
+                            row_dict[key] = json.loads(value)
+                        except Exception:
+                            pass
+                yield row_dict
     
     def update(self, table: str, id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Обновляет запись в SQLite."""
@@ -520,6 +641,15 @@ class SupabaseBackend(DatabaseBackend):
         response = self.client.table(table).insert(data).execute()
         row = response.data[0] if response.data else data
         return cast(Dict[str, Any], row)
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """Вставляет пачку записей одним bulk-запросом PostgREST."""
+        if not rows:
+            return 0
+        validate_table_name(table)
+
+        response = self.client.table(table).insert(rows).execute()
+        return len(response.data) if response.data else len(rows)
     
     def select(self, table: str, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Выбирает записи из Supabase."""
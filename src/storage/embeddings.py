@@ -8,7 +8,9 @@ import hashlib
 import json
 import math
 import os
+import threading
 
+from src.utils.json_utils import json_loads
 from src.utils.logging import get_logger
 
 logger = get_logger("storage.embeddings")
@@ -16,6 +18,14 @@ logger = get_logger("storage.embeddings")
 _embeddings_cache: Dict[str, List[float]] = {}
 _cache_file = Path(".cache/embeddings_cache.json")
 
+# ПОЧЕМУ module-level singletons: openai.OpenAI() поднимает HTTP-пул, а
+# SentenceTransformer(...) грузит сотни MB весов с диска — на каждый вызов
+# generate_embeddings это секунды. Создаём один раз под lock (double-checked).
+_clients_lock = threading.Lock()
+_openai_client: Any = None
+_openai_client_key: Optional[str] = None
+_st_model: Any = None
+
 
 def _load_cache() -> None:
     global _embeddings_cache
@@ -47,8 +57,11 @@ def _ensure_text_entries_table(db_path: Path | None = None) -> None:
         from src.utils.config import settings
         db_path = settings.STORAGE_PATH / "reflexio.db"
 
-    from src.storage.db import get_connection
-    conn = get_connection(db_path)
+    # ПОЧЕМУ get_reflexio_db: get_connection() здесь открывал новое соединение
+    # на каждый search/store и никогда его не закрывал. Пул ReflexioDB отдаёт
+    # thread-local connection с теми же pragmas.
+    from src.storage.db import get_reflexio_db
+    conn = get_reflexio_db(db_path).conn
 
     conn.execute(
         """
@@ -95,9 +108,15 @@ def _cosine(a: list[float], b: list[float]) -> float:
 
 
 def _get_cache_key(text: str, model: str) -> str:
-    # ПОЧЕМУ usedforsecurity=False: MD5 здесь только как cache key (быстрый хэш),
-    # не для криптографической защиты. SHA-256 используется для integrity chain.
-    return hashlib.md5(f"{model}:{text}".encode("utf-8"), usedforsecurity=False).hexdigest()  # nosec B324
+    # ПОЧЕМУ blake2b(digest_size=16): stdlib, быстрее MD5 на 64-bit и без
+    # B324-исключений; 128 бит более чем достаточно для cache key.
+    # update() по частям — без промежуточной f-строки с копией всего транскрипта.
+    # SHA-256 по-прежнему используется для integrity chain.
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(model.encode("utf-8"))
+    hasher.update(b":")
+    hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
 
 
 def _hash_fallback_embedding(text: str, dim: int = 384) -> List[float]:
@@ -106,6 +125,50 @@ def _hash_fallback_embedding(text: str, dim: int = 384) -> List[float]:
     return [float(base[i % len(base)]) / 255.0 for i in range(dim)]
 
 
+def _get_openai_client(api_key: str) -> Any:
+    """Возвращает закэшированный openai.OpenAI; пересоздаёт только при смене ключа."""
+    global _openai_client, _openai_client_key
+    if _openai_client is None or _openai_client_key != api_key:
+        with _clients_lock:
+            if _openai_client is None or _openai_client_key != api_key:
+                import openai
+
+                _openai_client = openai.OpenAI(api_key=api_key)
+                _openai_client_key = api_key
+    return _openai_client
+
+
+def _load_st_model() -> Any:
+    """Загружает MiniLM на PyTorch или, по LOCAL_EMBEDDINGS_BACKEND=onnx, на ONNX Runtime.
+
+    ПОЧЕМУ ONNX опционально: FP32 PyTorch на CPU упирается в eager-исполнение
+    графа; ONNX Runtime с fused kernels даёт ~2-4x на тех же весах. Векторы
+    приблизительно равны torch-векторам (расхождение ~1e-6 из-за другого
+    порядка float-операций), для cosine-сравнений со старым кэшем этого
+    достаточно. Нужны sentence-transformers>=3.2 и onnxruntime (в requirements
+    их нет) — при недоступности graceful fallback на torch.
+    """
+    from sentence_transformers import SentenceTransformer  # type: ignore[import-untyped]
+
+    backend = os.getenv("LOCAL_EMBEDDINGS_BACKEND", "torch").lower()
+    if backend != "torch":
+        try:
+            return SentenceTransformer("all-MiniLM-L6-v2", backend=backend)
+        except Exception as e:
+            logger.warning("local_embeddings_backend_unavailable", backend=backend, error=str(e))
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+
+def _get_st_model() -> Any:
+    """Возвращает закэшированную локальную модель SentenceTransformer (ленивая загрузка)."""
+    global _st_model
+    if _st_model is None:
+        with _clients_lock:
+            if _st_model is None:
+                _st_model = _load_st_model()
+    return _st_model
+
+
 _load_cache()
 
 
@@ -122,9 +185,7 @@ def generate_embeddings(text: str, model: str = "text-embedding-3-small", use_ca
     try:
         api_key = os.getenv("OPENAI_API_KEY")
         if api_key:
-            import openai
-
-            client = openai.OpenAI(api_key=api_key)
+            client = _get_openai_client(api_key)
             response = client.embeddings.create(model=model, input=text)
             embedding = response.data[0].embedding
     except Exception as e:
@@ -133,10 +194,7 @@ def generate_embeddings(text: str, model: str = "text-embedding-3-small", use_ca
     # Optional heavy local model only by explicit flag.
     if embedding is None and os.getenv("ENABLE_LOCAL_EMBEDDINGS", "false").lower() == "true":
         try:
-            from sentence_transformers import SentenceTransformer  # type: ignore[import-untyped]
-
-            model_st = SentenceTransformer("all-MiniLM-L6-v2")
-            embedding = model_st.encode(text).tolist()
+            embedding = _get_st_model().encode(text).tolist()
         except Exception as e:
             logger.warning("sentence_transformers_unavailable", error=str(e))
 
@@ -163,12 +221,15 @@ def store_embeddings(audio_id: str, segments: List[Dict[str, Any]], db_backend:
 
             db_backend = get_db()
 
+        # ПОЧЕМУ insert_many: поштучный insert() = отдельный commit на сегмент,
+        # для часовой записи это тысячи fsync. Копим строки и пишем одной пачкой.
+        rows: List[Dict[str, Any]] = []
         for segment in segments:
             text = segment.get("text", "")
             if not text:
                 continue
 
-            entry_data = {
+            rows.append({
                 "mission_id": audio_id,
                 "content": text,
                 "embedding": generate_embeddings(text),
@@ -177,8 +238,10 @@ def store_embeddings(audio_id: str, segments: List[Dict[str, Any]], db_backend:
                     "end_time": segment.get("end", segment.get("start", 0.0)),
                     "confidence": segment.get("confidence", 0.0),
                 },
-            }
-            db_backend.insert("text_entries", entry_data)
+            })
+
+        if rows:
+            db_backend.insert_many("text_entries", rows)
 
         return True
     except Exception as e:
@@ -224,7 +287,7 @@ def search_phrases(
             raw_emb = entry.get("embedding", "")
             if isinstance(raw_emb, str) and raw_emb:
                 try:
-                    entry_emb = json.loads(raw_emb)
+                    entry_emb = json_loads(raw_emb)
                 except (json.JSONDecodeError, TypeError):
                     pass
             elif isinstance(raw_emb, list):
@@ -235,7 +298,7 @@ def search_phrases(
             raw_meta = entry.get("metadata", "")
             if isinstance(raw_meta, str) and raw_meta:
                 try:
-                    meta = json.loads(raw_meta)
+                    meta = json_loads(raw_meta)
                 except (json.JSONDecodeError, TypeError):
                     pass
             elif isinstance(raw_meta, dict):
@@ -2,36 +2,74 @@
 
 from __future__ import annotations
 
+import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
 from src.storage.db import get_reflexio_db
 
+# ПОЧЕМУ константа модуля: тот же SQL-объект на каждый вызов → попадание в
+# statement cache соединения вместо повторной компиляции.
+_SQL_INSERT_HEALTH = """
+INSERT INTO health_metrics
+    (day, steps, avg_heart_rate, sleep_hours, stress_level, source, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_HEALTH_KEYS = (
+    "id",
+    "day",
+    "steps",
+    "avg_heart_rate",
+    "sleep_hours",
+    "stress_level",
+    "source",
+    "created_at",
+)
+_SQL_SELECT_HEALTH = f"SELECT {', '.join(_HEALTH_KEYS)} FROM health_metrics"  # nosec B608 — константы
+_SQL_SELECT_HEALTH_RANGE = (
+    _SQL_SELECT_HEALTH + " WHERE day BETWEEN ? AND ? ORDER BY day DESC, id DESC"
+)
+_SQL_SELECT_HEALTH_DAY = _SQL_SELECT_HEALTH + " WHERE day = ? ORDER BY id DESC"
+_SQL_SELECT_HEALTH_RECENT = _SQL_SELECT_HEALTH + " ORDER BY day DESC, id DESC LIMIT 200"
+
+# ПОЧЕМУ вся DDL одним списком: ensure_health_tables вызывается на каждый
+# save/list — схема применяется один раз на соединение через
+# ReflexioDB.ensure_schema (как ingest_persist._migrate).
+_MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS health_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        steps INTEGER,
+        avg_heart_rate INTEGER,
+        sleep_hours REAL,
+        stress_level REAL,
+        source TEXT DEFAULT 'android',
+        created_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_health_metrics_day ON health_metrics(day)",
+]
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> None:
+    # ПОЧЕМУ без transaction(): DDL с IF NOT EXISTS идемпотентна и
+    # выполняется в autocommit; отложенный BEGIN при апгрейде до записи
+    # может получить SQLITE_BUSY мимо busy_timeout.
+    for statement in _MIGRATIONS:
+        conn.execute(statement)
+
+
+def _migrate(db) -> None:
+    """Применяет _MIGRATIONS к БД один раз на соединение."""
+    db.ensure_schema("health_metrics", _apply_migrations)
+
 
 def ensure_health_tables(db_path: Path) -> None:
     """Создаёт таблицу и индекс для health_metrics, если не существуют."""
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    db = get_reflexio_db(db_path)
-    # ПОЧЕМУ: DDL (CREATE TABLE / CREATE INDEX) не оборачивается в transaction() —
-    # SQLite автоматически фиксирует DDL, а явный BEGIN DEFERRED может вызвать
-    # "cannot start a transaction within a transaction" при повторном вызове.
-    db.execute(
-        """
-        CREATE TABLE IF NOT EXISTS health_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            day TEXT NOT NULL,
-            steps INTEGER,
-            avg_heart_rate INTEGER,
-            sleep_hours REAL,
-            stress_level REAL,
-            source TEXT DEFAULT 'android',
-            created_at TEXT NOT NULL
-        )
-        """
-    )
-    db.execute("CREATE INDEX IF NOT EXISTS idx_health_metrics_day ON health_metrics(day)")
-    db.conn.commit()
+    _migrate(get_reflexio_db(db_path))
 
 
 def save_health_metrics(
@@ -50,11 +88,7 @@ def save_health_metrics(
     # гарантирует commit при успехе и rollback при любом исключении.
     with db.transaction():
         db.execute(
-            """
-            INSERT INTO health_metrics
-                (day, steps, avg_heart_rate, sleep_hours, stress_level, source, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
+            _SQL_INSERT_HEALTH,
             (
                 day,
                 steps,
@@ -73,18 +107,15 @@ def list_health_metrics(
     """Возвращает список метрик здоровья, опционально фильтруя по диапазону дат."""
     ensure_health_tables(db_path)
     db = get_reflexio_db(db_path)
-    # ПОЧЕМУ: db.fetchall() внутри уже вызывает conn.execute().fetchall(),
-    # row_factory=sqlite3.Row установлен в get_connection() — dict(r) работает корректно.
+    # ПОЧЕМУ явный список колонок + zip по _HEALTH_KEYS: dict(sqlite3.Row) хэширует
+    # имя каждой колонки через keys() на каждую строку; zip с константным
+    # кортежем ключей — без поиска по именам. row_factory общий для соединения,
+    # поэтому не отключаем его, а итерируем Row как кортеж.
     if day_from and day_to:
-        rows = db.fetchall(
-            "SELECT * FROM health_metrics WHERE day BETWEEN ? AND ? ORDER BY day DESC, id DESC",
-            (day_from, day_to),
-        )
+        rows = db.fetchall(_SQL_SELECT_HEALTH_RANGE, (day_from, day_to))
     elif day_from:
-        rows = db.fetchall(
-            "SELECT * FROM health_metrics WHERE day = ? ORDER BY id DESC", (day_from,)
-        )
+        rows = db.fetchall(_SQL_SELECT_HEALTH_DAY, (day_from,))
     else:
-        rows = db.fetchall("SELECT * FROM health_metrics ORDER BY day DESC, id DESC LIMIT 200")
+        rows = db.fetchall(_SQL_SELECT_HEALTH_RECENT)
 
-    return [dict(r) for r in rows]
+    return [dict(zip(_HEALTH_KEYS, r)) for r in rows]
@@ -6,14 +6,22 @@
 from __future__ import annotations
 
 import sqlite3
-import uuid
 import json
+from secrets import token_hex
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterable, Optional
 
 from src.storage.db import get_reflexio_db
 
+# ПОЧЕМУ orjson опционально: C-сериализатор в разы быстрее json.dumps на
+# JSON-колонках structured_events (emotions/topics/tasks/... — 6-7 dumps на
+# событие). Без orjson — stdlib json, читатели (json.loads) не отличают.
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None  # type: ignore[assignment]
+
 try:
     from src.utils.logging import get_logger
 except Exception:
@@ -28,6 +36,62 @@ logger = get_logger("storage.ingest_persist")
 QUALITY_STATES = ("trusted", "uncertain", "garbage", "quarantined")
 
 
+def _dumps(obj: Any) -> str:
+    """
+    json.dumps через orjson, если доступен (OPT_NON_STR_KEYS — как stdlib для int-ключей).
+
+    ПОЧЕМУ compact + ensure_ascii=False в stdlib-ветке: orjson пишет компактный
+    UTF-8 без \\uXXXX — байты в БД не должны зависеть от того, установлен ли
+    orjson (LIKE-поиск, сравнение текста, чексуммы строк).
+    """
+    if _orjson is not None:
+        return _orjson.dumps(obj, option=_orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+
+# ПОЧЕМУ SQL вынесен в константы модуля: один и тот же объект строки на каждый
+# вызов — sqlite3 находит готовый sqlite3_stmt в кэше соединения
+# (cached_statements в get_connection) без повторной сборки и компиляции.
+_SQL_INSERT_INGEST = """
+INSERT INTO ingest_queue (
+    id, filename, file_path, file_size, status,
+    transport_status, processing_status, created_at, processed_at,
+    quality_score, needs_recheck, quality_state, quality_reasons_json, review_required
+)
+VALUES (?, ?, ?, ?, 'transcribed', 'server_acked', 'transcribed', ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_INSERT_TRANSCRIPTION = """
+INSERT INTO transcriptions (
+    id, ingest_id, text, transcript_raw, transcript_clean,
+    language, language_probability, asr_model, asr_confidence,
+    garbage_flag, quality_score, needs_recheck,
+    quality_state, quality_reasons_json, review_required,
+    duration, segments, created_at, speaker_id, is_user, speaker_confidence, episode_id
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+"""
+_SQL_INSERT_STRUCTURED_EVENT = """
+INSERT INTO structured_events (
+    id, transcription_id, episode_id, timestamp, duration_sec, text, language,
+    summary, emotions, topics, domains, tasks, commitments,
+    decisions, speakers,
+    urgency, sentiment, location,
+    asr_confidence, enrichment_confidence, enrichment_model,
+    enrichment_tokens, enrichment_latency_ms, created_at,
+    version, supersedes_id, is_current,
+    pitch_hz_mean, pitch_variance, energy_mean,
+    spectral_centroid_mean, acoustic_arousal,
+    enrichment_prompt_hash, enrichment_version,
+    owner_scope, source_kind, lineage_id
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_INSERT_RECORDING_ANALYSIS = """
+INSERT INTO recording_analyses (id, transcription_id, summary, emotions, actions, topics, urgency, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
 def _existing_columns(cursor: sqlite3.Cursor, table_name: str) -> set[str]:
     rows = cursor.execute(f"PRAGMA table_info({table_name})").fetchall()
     return {str(row[1]) for row in rows}
@@ -148,6 +212,17 @@ def _ensure_sqlite_ingest_tables(conn: sqlite3.Connection) -> None:
             "speaker_confidence REAL DEFAULT 0.0",
         ],
     )
+    # ПОЧЕМУ индекс по ingest_id: dedupe в persist_ws_transcription и JOIN в
+    # get_enrichment_by_ingest_id ищут транскрипцию по ingest_id на каждый WS-файл.
+    # Имя совпадает со schema.sql — на БД из schema.sql дубль не создаётся.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transcriptions_ingest ON transcriptions(ingest_id)"
+    )
+    # ПОЧЕМУ индекс по created_at: retention (RetentionPolicy.cleanup_transcriptions)
+    # удаляет пачками по created_at < cutoff — range seek вместо полного скана.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transcriptions_created ON transcriptions(created_at)"
+    )
     _ensure_digest_cache_table(conn)
     _ensure_quality_transition_table(conn)
     conn.commit()
@@ -361,28 +436,21 @@ def save_recording_analysis(
     urgency: str,
 ) -> Optional[str]:
     """Сохраняет результат анализа в recording_analyses. Возвращает id записи или None."""
-    if not db_path.parent.exists():
-        db_path.parent.mkdir(parents=True, exist_ok=True)
     db = get_reflexio_db(db_path)
     try:
-        _ensure_recording_analyses_table(db.conn)
-        analysis_id = str(uuid.uuid4())
+        _migrate(db)
+        analysis_id = token_hex(16)
         now = datetime.now(timezone.utc).isoformat()
-        import json
-
         with db.transaction():
             db.execute(
-                """
-                INSERT INTO recording_analyses (id, transcription_id, summary, emotions, actions, topics, urgency, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
+                _SQL_INSERT_RECORDING_ANALYSIS,
                 (
                     analysis_id,
                     transcription_id,
                     summary or "",
-                    json.dumps(emotions) if emotions is not None else "[]",
-                    json.dumps(actions) if actions is not None else "[]",
-                    json.dumps(topics) if topics is not None else "[]",
+                    _dumps(emotions) if emotions is not None else "[]",
+                    _dumps(actions) if actions is not None else "[]",
+                    _dumps(topics) if topics is not None else "[]",
                     urgency or "medium",
                     now,
                 ),
@@ -478,6 +546,14 @@ def _ensure_structured_events_table(conn: sqlite3.Connection) -> None:
         ON structured_events(episode_id) WHERE is_current = 1
         """
     )
+    # ПОЧЕМУ (transcription_id, created_at DESC): JOIN + ORDER BY created_at DESC
+    # LIMIT 1 в get_enrichment_by_ingest_id берёт первую запись из индекса без сортировки.
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_structured_events_tid_created
+        ON structured_events(transcription_id, created_at DESC)
+        """
+    )
     # VIEW для удобства — всегда показывает только актуальные версии
     cursor.execute(
         """
@@ -521,29 +597,100 @@ def _ensure_client_signposts_table(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def persist_structured_event(db_path: Path, event) -> Optional[str]:
-    """Append-only сохранение StructuredEvent. Возвращает event.id или None.
+def _model_dumps(items: list, fallback: Callable[[Any], Any]) -> list:
+    """model_dump() для списка моделей; fallback — для элементов без model_dump.
 
-    ПОЧЕМУ append-only вместо INSERT OR REPLACE:
-    REPLACE уничтожает предыдущую версию — теряется история обогащений.
-    Append-only: старая версия помечается is_current=0, новая вставляется
-    с version+1 и supersedes_id → полная history для аудита и отката.
+    ПОЧЕМУ проверка по первому элементу: StructuredEvent валидирует tasks/commitments
+    как list[Model] — список однородный, hasattr на каждый элемент не нужен.
+    Смешанный список (duck-typed event) уходит в поэлементный fallback.
     """
-    if not db_path.parent.exists():
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-    db = get_reflexio_db(db_path)
-    try:
-        _ensure_structured_events_table(db.conn)
-        import json
-
-        tasks_json = json.dumps(
-            [
-                t.model_dump() if hasattr(t, "model_dump") else {"text": str(t)}
-                for t in (event.tasks or [])
-            ]
-        )
+    if items and hasattr(items[0], "model_dump"):
+        try:
+            return [item.model_dump() for item in items]
+        except AttributeError:
+            pass
+    return [item.model_dump() if hasattr(item, "model_dump") else fallback(item) for item in items]
 
-        with db.transaction():
+
+def _task_fallback(task: Any) -> dict[str, str]:
+    return {"text": str(task)}
+
+
+def _event_to_params(event, version: int, supersedes_id: Optional[str]) -> tuple:
+    """Собирает кортеж параметров INSERT для одной версии StructuredEvent."""
+    domains = getattr(event, "domains", None)
+    tasks = _model_dumps(event.tasks or [], _task_fallback)
+    commitments = _model_dumps(event.commitments or [], lambda c: c)
+    timestamp = event.timestamp
+    created_at = event.created_at
+    return (
+        event.id,
+        event.transcription_id,
+        getattr(event, "episode_id", None),
+        timestamp.isoformat() if timestamp else None,
+        event.duration_sec,
+        event.text,
+        event.language,
+        event.summary,
+        _dumps(event.emotions) if event.emotions else "[]",
+        _dumps(event.topics) if event.topics else "[]",
+        _dumps(domains) if domains else "[]",
+        _dumps(tasks) if tasks else "[]",
+        _dumps(commitments) if commitments else "[]",
+        _dumps(event.decisions) if event.decisions else "[]",
+        _dumps(event.speakers) if event.speakers else "[]",
+        event.urgency,
+        event.sentiment,
+        event.location,
+        event.asr_confidence,
+        event.enrichment_confidence,
+        event.enrichment_model,
+        event.enrichment_tokens,
+        event.enrichment_latency_ms,
+        created_at.isoformat() if created_at else None,
+        version,
+        supersedes_id,
+        1,  # is_current
+        getattr(event, "pitch_hz_mean", None),
+        getattr(event, "pitch_variance", None),
+        getattr(event, "energy_mean", None),
+        getattr(event, "spectral_centroid_mean", None),
+        getattr(event, "acoustic_arousal", None),
+        getattr(event, "enrichment_prompt_hash", None),
+        getattr(event, "enrichment_version", ""),
+        # WHY: Memory Backbone contract fields for ownership/provenance
+        getattr(event, "owner_scope", "self"),
+        getattr(event, "source_kind", "user_speech"),
+        event.transcription_id,  # lineage_id = transcription_id
+    )
+
+
+def _insert_structured_events(db, events: list) -> list[int]:
+    """Append-only вставка пачки событий внутри уже открытой транзакции.
+
+    Возвращает номера версий в порядке events.
+
+    ПОЧЕМУ версии внутри пачки считаем в памяти: несколько версий одного
+    episode/transcription в одном батче не видны SELECT'у до executemany,
+    поэтому предыдущую версию из этой же пачки отслеживаем в batch_current.
+    """
+    batch_current: dict[tuple[str, Any], tuple[str, int]] = {}
+    superseded: list[tuple[str]] = []
+    params: list[tuple] = []
+    versions: list[int] = []
+    for event in events:
+        episode_id = getattr(event, "episode_id", None)
+        if episode_id is not None:
+            key = ("episode", episode_id)
+        else:
+            key = ("transcription", event.transcription_id)
+        version = 1
+        supersedes_id = None
+        if key in batch_current:
+            supersedes_id, prev_version = batch_current[key]
+            version = prev_version + 1
+            superseded.append((supersedes_id,))
+        else:
             # Ищем текущую версию для этого transcription_id
             existing = db.fetchone(
                 """
@@ -553,107 +700,59 @@ def persist_structured_event(db_path: Path, event) -> Optional[str]:
                     OR (transcription_id = ? AND ? IS NULL)
                 ) AND is_current = 1
                 """,
-                (
-                    getattr(event, "episode_id", None),
-                    getattr(event, "episode_id", None),
-                    event.transcription_id,
-                    getattr(event, "episode_id", None),
-                ),
+                (episode_id, episode_id, event.transcription_id, episode_id),
             )
-
-            version = 1
-            supersedes_id = None
             if existing:
                 version = (existing["version"] or 1) + 1
                 supersedes_id = existing["id"]
-                # Помечаем старую версию как неактуальную
-                db.execute(
-                    "UPDATE structured_events SET is_current = 0 WHERE id = ?",
-                    (existing["id"],),
-                )
+                superseded.append((existing["id"],))
+        batch_current[key] = (event.id, version)
+        params.append(_event_to_params(event, version, supersedes_id))
+        versions.append(version)
 
-            db.execute(
-                """
-                INSERT INTO structured_events (
-                    id, transcription_id, episode_id, timestamp, duration_sec, text, language,
-                    summary, emotions, topics, domains, tasks, commitments,
-                    decisions, speakers,
-                    urgency, sentiment, location,
-                    asr_confidence, enrichment_confidence, enrichment_model,
-                    enrichment_tokens, enrichment_latency_ms, created_at,
-                    version, supersedes_id, is_current,
-                    pitch_hz_mean, pitch_variance, energy_mean,
-                    spectral_centroid_mean, acoustic_arousal,
-                    enrichment_prompt_hash, enrichment_version,
-                    owner_scope, source_kind, lineage_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    event.id,
-                    event.transcription_id,
-                    getattr(event, "episode_id", None),
-                    event.timestamp.isoformat() if event.timestamp else None,
-                    event.duration_sec,
-                    event.text,
-                    event.language,
-                    event.summary,
-                    json.dumps(event.emotions) if event.emotions else "[]",
-                    json.dumps(event.topics) if event.topics else "[]",
-                    json.dumps(getattr(event, "domains", []))
-                    if getattr(event, "domains", None)
-                    else "[]",
-                    tasks_json,
-                    json.dumps(
-                        [
-                            c.model_dump() if hasattr(c, "model_dump") else c
-                            for c in (event.commitments or [])
-                        ]
-                    )
-                    if event.commitments
-                    else "[]",
-                    json.dumps(event.decisions) if event.decisions else "[]",
-                    json.dumps(event.speakers) if event.speakers else "[]",
-                    event.urgency,
-                    event.sentiment,
-                    event.location,
-                    event.asr_confidence,
-                    event.enrichment_confidence,
-                    event.enrichment_model,
-                    event.enrichment_tokens,
-                    event.enrichment_latency_ms,
-                    event.created_at.isoformat() if event.created_at else None,
-                    version,
-                    supersedes_id,
-                    1,  # is_current
-                    getattr(event, "pitch_hz_mean", None),
-                    getattr(event, "pitch_variance", None),
-                    getattr(event, "energy_mean", None),
-                    getattr(event, "spectral_centroid_mean", None),
-                    getattr(event, "acoustic_arousal", None),
-                    getattr(event, "enrichment_prompt_hash", None),
-                    getattr(event, "enrichment_version", ""),
-                    # WHY: Memory Backbone contract fields for ownership/provenance
-                    getattr(event, "owner_scope", "self"),
-                    getattr(event, "source_kind", "user_speech"),
-                    event.transcription_id,  # lineage_id = transcription_id
-                ),
-            )
+    db.executemany(_SQL_INSERT_STRUCTURED_EVENT, params)
+    if superseded:
+        # Помечаем старые версии как неактуальные
+        db.executemany("UPDATE structured_events SET is_current = 0 WHERE id = ?", superseded)
+    return versions
+
+
+def _index_events_vec(db, events: list) -> None:
+    """Индексирует тексты событий в sqlite-vec (best-effort)."""
+    # ПОЧЕМУ async vec indexing: не блокируем pipeline если sqlite-vec недоступен.
+    # Graceful — при ошибке только warning, событие уже сохранено.
+    for event in events:
+        if not event.text:
+            continue
+        try:
+            from src.storage.vec_search import index_event, load_vec_extension
+
+            load_vec_extension(db.conn)
+            index_event(db.conn, event.id, event.text)
+        except Exception as _ve:
+            logger.warning("vec_index_skipped", event_id=event.id, error=str(_ve))
+
+
+def persist_structured_event(db_path: Path, event) -> Optional[str]:
+    """Append-only сохранение StructuredEvent. Возвращает event.id или None.
+
+    ПОЧЕМУ append-only вместо INSERT OR REPLACE:
+    REPLACE уничтожает предыдущую версию — теряется история обогащений.
+    Append-only: старая версия помечается is_current=0, новая вставляется
+    с version+1 и supersedes_id → полная history для аудита и отката.
+    """
+    db = get_reflexio_db(db_path)
+    try:
+        _migrate(db)
+        with db.transaction(immediate=True):
+            (version,) = _insert_structured_events(db, [event])
         logger.info(
             "structured_event_persisted",
             event_id=event.id,
             transcription_id=event.transcription_id,
             version=version,
         )
-        # ПОЧЕМУ async vec indexing: не блокируем pipeline если sqlite-vec недоступен.
-        # Graceful — при ошибке только warning, событие уже сохранено.
-        if event.text:
-            try:
-                from src.storage.vec_search import index_event, load_vec_extension
-
-                load_vec_extension(db.conn)
-                index_event(db.conn, event.id, event.text)
-            except Exception as _ve:
-                logger.warning("vec_index_skipped", event_id=event.id, error=str(_ve))
+        _index_events_vec(db, [event])
         return str(event.id)
     except Exception as e:
         logger.exception(
@@ -662,6 +761,28 @@ def persist_structured_event(db_path: Path, event) -> Optional[str]:
         return None
 
 
+def persist_structured_events_bulk(db_path: Path, events: list) -> list[str]:
+    """Append-only сохранение пачки StructuredEvent одной транзакцией.
+
+    ПОЧЕМУ одна транзакция: N вызовов persist_structured_event = N COMMIT'ов
+    (N fsync в WAL). Для backfill/replay пачка пишется одним BEGIN…COMMIT
+    и одним executemany. При ошибке откатывается вся пачка — возвращает [].
+    """
+    if not events:
+        return []
+    db = get_reflexio_db(db_path)
+    try:
+        _migrate(db)
+        with db.transaction(immediate=True):
+            _insert_structured_events(db, events)
+        logger.info("structured_events_bulk_persisted", count=len(events))
+        _index_events_vec(db, events)
+        return [str(event.id) for event in events]
+    except Exception as e:
+        logger.exception("structured_events_bulk_persist_failed", count=len(events), error=str(e))
+        return []
+
+
 def _ensure_consumed_content_table(conn: sqlite3.Connection) -> None:
     """Consumed content store — TV, YouTube, podcasts, reels the user watches/listens to.
 
@@ -729,18 +850,34 @@ def _ensure_user_profile_table(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
+# ПОЧЕМУ единый список шагов схемы: _ensure_* выполняют CREATE TABLE IF NOT
+# EXISTS, PRAGMA table_info/ALTER и COMMIT — на каждом INSERT это дороже самой
+# записи. Вся схема применяется один раз на соединение (ReflexioDB.ensure_schema);
+# шаги — функции, а не SQL-строки, т.к. догоняют колонки старых БД через ALTER.
+_MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _ensure_sqlite_ingest_tables,
+    _ensure_recording_analyses_table,
+    _ensure_episodes_tables,
+    _ensure_structured_events_table,
+    _ensure_client_signposts_table,
+    _ensure_consumed_content_table,
+    _ensure_user_profile_table,
+]
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> None:
+    for step in _MIGRATIONS:
+        step(conn)
+
+
+def _migrate(db) -> None:
+    """Применяет _MIGRATIONS к БД один раз на соединение."""
+    db.ensure_schema("ingest", _apply_migrations)
+
+
 def ensure_ingest_tables(db_path: Path) -> None:
     """Создаёт таблицы ingest_queue, transcriptions, structured_events при отсутствии."""
-    if not db_path.parent.exists():
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-    db = get_reflexio_db(db_path)
-    _ensure_sqlite_ingest_tables(db.conn)
-    _ensure_recording_analyses_table(db.conn)
-    _ensure_episodes_tables(db.conn)
-    _ensure_structured_events_table(db.conn)
-    _ensure_client_signposts_table(db.conn)
-    _ensure_consumed_content_table(db.conn)
-    _ensure_user_profile_table(db.conn)
+    _migrate(get_reflexio_db(db_path))
 
 
 def write_digest_cache(
@@ -755,15 +892,26 @@ def write_digest_cache(
     changed_source_count: int = 0,
 ) -> None:
     db = get_reflexio_db(db_path)
-    _ensure_digest_cache_table(db.conn)
+    _migrate(db)
     generated_at = datetime.now(timezone.utc).isoformat()
     with db.transaction():
+        # ПОЧЕМУ ON CONFLICT DO UPDATE вместо INSERT OR REPLACE: REPLACE удаляет
+        # строку и вставляет заново (DELETE+INSERT, переписывает PK-индекс);
+        # upsert обновляет существующую строку на месте.
         db.execute(
             """
-            INSERT OR REPLACE INTO digest_cache (
+            INSERT INTO digest_cache (
                 date, digest_json, generated_at, status,
                 previous_digest_id, rebuild_reason, rebuilt_at, changed_source_count
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                digest_json = excluded.digest_json,
+                generated_at = excluded.generated_at,
+                status = excluded.status,
+                previous_digest_id = excluded.previous_digest_id,
+                rebuild_reason = excluded.rebuild_reason,
+                rebuilt_at = excluded.rebuilt_at,
+                changed_source_count = excluded.changed_source_count
             """,
             (
                 day_key,
@@ -783,7 +931,7 @@ def get_existing_ingest(db_path: Path, *, segment_id: str | None = None) -> Opti
     if not segment_id:
         return None
     db = get_reflexio_db(db_path)
-    _ensure_sqlite_ingest_tables(db.conn)
+    _migrate(db)
     return db.fetchone(
         "SELECT * FROM ingest_queue WHERE segment_id = ? ORDER BY created_at DESC LIMIT 1",
         (segment_id,),
@@ -795,7 +943,7 @@ def get_transcription_by_ingest_id(db_path: Path, ingest_id: str) -> Optional[di
     if not db_path.exists():
         return None
     db = get_reflexio_db(db_path)
-    _ensure_sqlite_ingest_tables(db.conn)
+    _migrate(db)
     row = db.fetchone(
         """
         SELECT text, transcript_clean, language, language_probability, quality_score, needs_recheck, quality_state
@@ -818,15 +966,35 @@ def get_transcription_by_ingest_id(db_path: Path, ingest_id: str) -> Optional[di
     }
 
 
+# ПОЧЕМУ 900: SQLITE_MAX_VARIABLE_NUMBER в старых сборках — 999, берём с запасом.
+_EXISTS_CHUNK_SIZE = 900
+
+
+def transcriptions_exist(db_path: Path, ids: Iterable[str]) -> set[str]:
+    """Возвращает подмножество ids, для которых есть запись в transcriptions.
+
+    ПОЧЕМУ bulk: dedupe-проходы проверяли id по одному — N запросов вместо
+    одного IN (...) на каждые _EXISTS_CHUNK_SIZE id.
+    """
+    wanted = list(dict.fromkeys(ids))
+    if not wanted or not db_path.exists():
+        return set()
+    db = get_reflexio_db(db_path)
+    found: set[str] = set()
+    for start in range(0, len(wanted), _EXISTS_CHUNK_SIZE):
+        chunk = wanted[start : start + _EXISTS_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = db.fetchall(
+            f"SELECT id FROM transcriptions WHERE id IN ({placeholders})",  # nosec B608 — только плейсхолдеры
+            tuple(chunk),
+        )
+        found.update(str(row[0]) for row in rows)
+    return found
+
+
 def transcription_exists(db_path: Path, transcription_id: str) -> bool:
     """Проверяет, есть ли запись в transcriptions с данным id."""
-    if not db_path.exists():
-        return False
-    db = get_reflexio_db(db_path)
-    return (
-        db.fetchone("SELECT 1 FROM transcriptions WHERE id = ? LIMIT 1", (transcription_id,))
-        is not None
-    )
+    return transcription_id in transcriptions_exist(db_path, [transcription_id])
 
 
 def get_enrichment_by_ingest_id(db_path: Path, file_id: str) -> Optional[dict[str, Any]]:
@@ -850,8 +1018,6 @@ def get_enrichment_by_ingest_id(db_path: Path, file_id: str) -> Optional[dict[st
         )
         if not row:
             return None
-        import json
-
         return {
             "summary": row["summary"] or "",
             "emotions": json.loads(row["emotions"]) if row["emotions"] else [],
@@ -869,6 +1035,137 @@ def get_enrichment_by_ingest_id(db_path: Path, file_id: str) -> Optional[dict[st
         return None
 
 
+def _write_ws_transcription(
+    db,
+    file_id: str,
+    filename: str,
+    file_path: str,
+    file_size: int,
+    result: dict[str, Any],
+    now: str,
+) -> tuple[str, bool]:
+    """Пишет одну WS-транскрипцию внутри уже открытой транзакции.
+
+    now — общий ISO-timestamp для created_at/processed_at (один на вызов или батч).
+    Возвращает (transcription_id, created): created=False — запись уже была.
+    """
+    existing_queue = db.fetchone("SELECT 1 FROM ingest_queue WHERE id = ?", (file_id,))
+    if not existing_queue:
+        db.execute(
+            _SQL_INSERT_INGEST,
+            (
+                file_id,
+                filename,
+                file_path,
+                file_size,
+                now,
+                now,
+                result.get("quality_score"),
+                1 if result.get("needs_recheck") else 0,
+                result.get("quality_state") or "trusted",
+                _dumps(result.get("quality_reasons_json") or []),
+                1 if result.get("review_required") else 0,
+            ),
+        )
+    else:
+        db.execute(
+            """
+            UPDATE ingest_queue
+            SET status='transcribed',
+                transport_status='server_acked',
+                processing_status='transcribed',
+                processed_at=?,
+                error_code=NULL,
+                error_message=NULL,
+                quality_score=?,
+                needs_recheck=?,
+                quality_state=?,
+                quality_reasons_json=?,
+                review_required=?
+            WHERE id=?
+            """,
+            (
+                now,
+                result.get("quality_score"),
+                1 if result.get("needs_recheck") else 0,
+                result.get("quality_state") or "trusted",
+                _dumps(result.get("quality_reasons_json") or []),
+                1 if result.get("review_required") else 0,
+                file_id,
+            ),
+        )
+
+    existing = db.fetchone("SELECT id FROM transcriptions WHERE ingest_id = ? LIMIT 1", (file_id,))
+    if existing:
+        logger.debug(
+            "transcription_already_persisted", file_id=file_id, transcription_id=existing[0]
+        )
+        return str(existing[0]), False
+
+    # ПОЧЕМУ token_hex(16) вместо str(uuid4()): те же 128 бит энтропии из
+    # os.urandom, но 32 символа без дефисов — короче строка в каждой строке
+    # и каждом индексе. id непрозрачен: никто не парсит его как UUID
+    # (в Postgres transcriptions.id — TEXT).
+    transcription_id = token_hex(16)
+    text = result.get("text") or ""
+    transcript_raw = result.get("transcript_raw") or text
+    transcript_clean = result.get("transcript_clean") or text
+    language = result.get("language")
+    language_probability = result.get("language_probability")
+    asr_model = result.get("asr_model")
+    asr_confidence = result.get("asr_confidence")
+    garbage_flag = 1 if result.get("garbage_flag") else 0
+    quality_score = result.get("quality_score")
+    needs_recheck = 1 if result.get("needs_recheck") else 0
+    duration = result.get("duration")
+    segments = result.get("segments")
+
+    # ПОЧЕМУ цепочка веток: None и уже сериализованная строка (частый случай из
+    # WS-слоя) обходятся без try; bytes (orjson-вывод) декодируются как есть.
+    if segments is None or isinstance(segments, str):
+        segments_str = segments
+    elif isinstance(segments, bytes):
+        segments_str = segments.decode("utf-8", errors="replace")
+    else:
+        try:
+            segments_str = _dumps(segments)
+        except (TypeError, ValueError):
+            segments_str = None
+
+    # ПОЧЕМУ speaker_* в INSERT: до этого фикса verification логировалась,
+    # но не сохранялась — все записи имели speaker_confidence=0, is_user=1.
+    speaker_confidence = result.get("speaker_confidence", 0.0)
+    is_user = 1 if result.get("is_user", True) else 0
+    speaker_id = result.get("speaker_id", 0)
+    db.execute(
+        _SQL_INSERT_TRANSCRIPTION,
+        (
+            transcription_id,
+            file_id,
+            transcript_clean,
+            transcript_raw,
+            transcript_clean,
+            language,
+            language_probability,
+            asr_model,
+            asr_confidence,
+            garbage_flag,
+            quality_score,
+            needs_recheck,
+            result.get("quality_state") or "trusted",
+            _dumps(result.get("quality_reasons_json") or []),
+            1 if result.get("review_required") else 0,
+            duration,
+            segments_str,
+            now,
+            speaker_id,
+            is_user,
+            speaker_confidence,
+        ),
+    )
+    return transcription_id, True
+
+
 def persist_ws_transcription(
     db_path: Path,
     file_id: str,
@@ -885,145 +1182,62 @@ def persist_ws_transcription(
             result_type=type(result).__name__,
         )
         return None
-    if not db_path.parent.exists():
-        db_path.parent.mkdir(parents=True, exist_ok=True)
     db = get_reflexio_db(db_path)
     try:
-        _ensure_sqlite_ingest_tables(db.conn)
-        _ensure_episodes_tables(db.conn)
-
-        existing_queue = db.fetchone("SELECT 1 FROM ingest_queue WHERE id = ?", (file_id,))
-        with db.transaction():
-            if not existing_queue:
-                now = datetime.now(timezone.utc).isoformat()
-                db.execute(
-                    """
-                    INSERT INTO ingest_queue (
-                        id, filename, file_path, file_size, status,
-                        transport_status, processing_status, created_at, processed_at,
-                        quality_score, needs_recheck
-                    , quality_state, quality_reasons_json, review_required
-                    )
-                    VALUES (?, ?, ?, ?, 'transcribed', 'server_acked', 'transcribed', ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        file_id,
-                        filename,
-                        file_path,
-                        file_size,
-                        now,
-                        now,
-                        result.get("quality_score"),
-                        1 if result.get("needs_recheck") else 0,
-                        result.get("quality_state") or "trusted",
-                        json.dumps(result.get("quality_reasons_json") or []),
-                        1 if result.get("review_required") else 0,
-                    ),
-                )
-            else:
-                db.execute(
-                    """
-                    UPDATE ingest_queue
-                    SET status='transcribed',
-                        transport_status='server_acked',
-                        processing_status='transcribed',
-                        processed_at=?,
-                        error_code=NULL,
-                        error_message=NULL,
-                        quality_score=?,
-                        needs_recheck=?,
-                        quality_state=?,
-                        quality_reasons_json=?,
-                        review_required=?
-                    WHERE id=?
-                    """,
-                    (
-                        datetime.now(timezone.utc).isoformat(),
-                        result.get("quality_score"),
-                        1 if result.get("needs_recheck") else 0,
-                        result.get("quality_state") or "trusted",
-                        json.dumps(result.get("quality_reasons_json") or []),
-                        1 if result.get("review_required") else 0,
-                        file_id,
-                    ),
-                )
+        _migrate(db)
 
-            existing = db.fetchone(
-                "SELECT id FROM transcriptions WHERE ingest_id = ? LIMIT 1", (file_id,)
+        # ПОЧЕМУ IMMEDIATE: ingest_queue + transcriptions пишутся одной транзакцией
+        # (один COMMIT), а проверки существования внутри неё не должны упираться
+        # в SQLITE_BUSY при апгрейде read→write lock.
+        now = datetime.now(timezone.utc).isoformat()
+        with db.transaction(immediate=True):
+            transcription_id, created = _write_ws_transcription(
+                db, file_id, filename, file_path, file_size, result, now
             )
-            if existing:
-                logger.debug(
-                    "transcription_already_persisted", file_id=file_id, transcription_id=existing[0]
-                )
-                return str(existing[0])
-
-            transcription_id = str(uuid.uuid4())
-            text = result.get("text") or ""
-            transcript_raw = result.get("transcript_raw") or text
-            transcript_clean = result.get("transcript_clean") or text
-            language = result.get("language")
-            language_probability = result.get("language_probability")
-            asr_model = result.get("asr_model")
-            asr_confidence = result.get("asr_confidence")
-            garbage_flag = 1 if result.get("garbage_flag") else 0
-            quality_score = result.get("quality_score")
-            needs_recheck = 1 if result.get("needs_recheck") else 0
-            duration = result.get("duration")
-            segments = result.get("segments")
-
-            segments_str = None
-            if segments is not None:
-                try:
-                    segments_str = (
-                        json.dumps(segments) if not isinstance(segments, str) else segments
-                    )
-                except (TypeError, ValueError):
-                    segments_str = None
-
-            # ПОЧЕМУ speaker_* в INSERT: до этого фикса verification логировалась,
-            # но не сохранялась — все записи имели speaker_confidence=0, is_user=1.
-            speaker_confidence = result.get("speaker_confidence", 0.0)
-            is_user = 1 if result.get("is_user", True) else 0
-            speaker_id = result.get("speaker_id", 0)
-            db.execute(
-                """
-                INSERT INTO transcriptions (
-                    id, ingest_id, text, transcript_raw, transcript_clean,
-                    language, language_probability, asr_model, asr_confidence,
-                    garbage_flag, quality_score, needs_recheck,
-                    quality_state, quality_reasons_json, review_required,
-                    duration, segments, created_at, speaker_id, is_user, speaker_confidence, episode_id
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
-                """,
-                (
-                    transcription_id,
-                    file_id,
-                    transcript_clean,
-                    transcript_raw,
-                    transcript_clean,
-                    language,
-                    language_probability,
-                    asr_model,
-                    asr_confidence,
-                    garbage_flag,
-                    quality_score,
-                    needs_recheck,
-                    result.get("quality_state") or "trusted",
-                    json.dumps(result.get("quality_reasons_json") or []),
-                    1 if result.get("review_required") else 0,
-                    duration,
-                    segments_str,
-                    datetime.now(timezone.utc).isoformat(),
-                    speaker_id,
-                    is_user,
-                    speaker_confidence,
-                ),
+        if created:
+            logger.info(
+                "ws_transcription_persisted", file_id=file_id, transcription_id=transcription_id
             )
-        logger.info(
-            "ws_transcription_persisted", file_id=file_id, transcription_id=transcription_id
-        )
         return transcription_id
     except Exception as e:
         logger.exception("ws_transcription_persist_failed", file_id=file_id, error=str(e))
         return None
+
+
+def persist_ws_transcriptions_bulk(
+    db_path: Path,
+    items: list[tuple[str, str, str, int, dict[str, Any]]],
+) -> list[Optional[str]]:
+    """Сохраняет пачку WS-транскрипций одной транзакцией.
+
+    items — кортежи (file_id, filename, file_path, file_size, result), как
+    аргументы persist_ws_transcription. Возвращает transcription_id по каждому
+    item (None для невалидного result). При ошибке БД откатывается вся пачка.
+    """
+    if not items:
+        return []
+    db = get_reflexio_db(db_path)
+    ids: list[Optional[str]] = [None] * len(items)
+    try:
+        _migrate(db)
+
+        # ПОЧЕМУ один now на батч: строки пачки пишутся одним COMMIT —
+        # общий timestamp честно отражает момент записи и не форматируется N раз.
+        now = datetime.now(timezone.utc).isoformat()
+        with db.transaction(immediate=True):
+            for idx, (file_id, filename, file_path, file_size, result) in enumerate(items):
+                if not result or not isinstance(result, dict):
+                    logger.warning(
+                        "persist_ws_transcription_invalid_result",
+                        file_id=file_id,
+                        result_type=type(result).__name__,
+                    )
+                    continue
+                ids[idx], _ = _write_ws_transcription(
+                    db, file_id, filename, file_path, file_size, result, now
+                )
+        logger.info("ws_transcriptions_bulk_persisted", count=len(items))
+        return ids
+    except Exception as e:
+        logger.exception("ws_transcriptions_bulk_persist_failed", count=len(items), error=str(e))
+        return [None] * len(items)
@@ -3,56 +3,153 @@ from __future__ import annotations
 
 import hashlib
 import json
+import os
+import sqlite3
+import time
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, cast
 
 from src.storage.db import get_reflexio_db
 from src.utils.logging import get_logger
 
+# ПОЧЕМУ blake3 опционально: в разы быстрее SHA-256 на крупных артефактах
+# (SIMD + многопоточность внутри), но это внешняя C-зависимость. Без пакета —
+# SHA-256, как раньше.
+try:
+    import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
 logger = get_logger("storage.integrity")
 
+DEFAULT_HASH_ALGO = "sha256"
+
+_SQL_INSERT_EVENT = """
+INSERT INTO integrity_events (id, ingest_id, stage, content_hash, prev_hash, metadata, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def _uuid7() -> str:
+    """UUIDv7 (RFC 9562): 48 бит unix-времени в мс, версия, вариант, случайные биты.
+
+    ПОЧЕМУ не uuid4: случайные id разбрасывают вставки по всему B-tree
+    PRIMARY KEY; id, растущие со временем, ложатся в правый лист —
+    меньше грязных страниц WAL на транзакцию. Хранение то же (TEXT).
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version 7
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # variant RFC 4122/9562
+    return str(uuid.UUID(int=value))
+
+
 def ensure_integrity_tables(db_path: Path) -> None:
     """Create integrity tables if absent."""
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # ПОЧЕМУ ensure_schema: append_integrity_event вызывается на каждую стадию
+    # ingest — DDL нужен один раз на соединение, а не на каждый вызов.
+    get_reflexio_db(db_path).ensure_schema("integrity", _create_integrity_tables)
+
+
+def _create_integrity_tables(conn: sqlite3.Connection) -> None:
     # ПОЧЕМУ без db.transaction(): DDL (CREATE TABLE) auto-commits в SQLite.
     # Оборачивание в transaction() вызывает лишний conn.commit() после auto-commit,
     # что может сбить implicit transaction state в Python sqlite3 модуле.
-    db = get_reflexio_db(db_path)
-    db.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS integrity_events (
             id TEXT PRIMARY KEY,
             ingest_id TEXT NOT NULL,
             stage TEXT NOT NULL,
-            content_hash TEXT NOT NULL,
-            prev_hash TEXT,
+            content_hash BLOB NOT NULL,
+            prev_hash BLOB,
             metadata TEXT,
             created_at TEXT NOT NULL
         )
         """
     )
-    db.execute(
+    conn.execute(
         "CREATE INDEX IF NOT EXISTS idx_integrity_ingest_created ON integrity_events(ingest_id, created_at)"
     )
-    db.conn.commit()
+    conn.commit()
+
 
+def _resolve_hash_algo() -> str:
+    """Алгоритм из settings.INTEGRITY_HASH_ALGO; blake3 без пакета → sha256."""
+    from src.utils.config import settings
 
-def _compute_hash(payload_bytes: bytes | None, payload_text: str | None) -> str:
-    hasher = hashlib.sha256()
+    algo = str(getattr(settings, "INTEGRITY_HASH_ALGO", DEFAULT_HASH_ALGO)).lower()
+    if algo == "blake3" and _blake3 is not None:
+        return algo
+    if algo != DEFAULT_HASH_ALGO:
+        logger.warning("integrity_hash_algo_unavailable", requested=algo, using=DEFAULT_HASH_ALGO)
+    return DEFAULT_HASH_ALGO
+
+
+def _new_hasher(algo: str) -> Any:
+    if algo == "blake3":
+        return _blake3.blake3(max_threads=_blake3.blake3.AUTO)
+    return hashlib.sha256()
+
+
+def _compute_hash(payload: bytes, algo: str = DEFAULT_HASH_ALGO) -> bytes:
+    # ПОЧЕМУ hashlib.sha256(payload) одним вызовом: OpenSSL-бэкенд hashlib сам
+    # выбирает SHA-NI/AVX — отдельный update() и перекодирование внутри не нужны.
+    # Текст кодируется один раз на границе (append_integrity_event).
+    if algo == DEFAULT_HASH_ALGO:
+        return hashlib.sha256(payload).digest()
+    hasher = _new_hasher(algo)
+    hasher.update(payload)
+    return cast(bytes, hasher.digest())
+
+
+def _compute_hash_stream(source: Path | Iterable[bytes], algo: str = DEFAULT_HASH_ALGO) -> bytes:
+    # ПОЧЕМУ потоково: крупный артефакт (аудио) не нужно держать в RAM целиком
+    # ради хэша. hashlib.file_digest читает файл блоками в C без копий в Python;
+    # для итератора — update() по чанкам.
+    if isinstance(source, Path):
+        with source.open("rb") as fh:
+            return hashlib.file_digest(fh, lambda: _new_hasher(algo)).digest()
+    hasher = _new_hasher(algo)
+    for chunk in source:
+        hasher.update(chunk)
+    return cast(bytes, hasher.digest())
+
+
+def _hash_hex(value: bytes | str | None) -> str | None:
+    """Хэш из БД → hex для отчёта (строки до перехода на BLOB — как есть)."""
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def _payload_hash(
+    payload_bytes: bytes | None,
+    payload_text: str | None,
+    payload_path: Path | None,
+    algo: str = DEFAULT_HASH_ALGO,
+) -> bytes:
+    """Хэш payload: bytes → файл (потоково) → текст (utf-8) → пустой payload."""
     if payload_bytes is not None:
-        hasher.update(payload_bytes)
-    elif payload_text is not None:
-        hasher.update(payload_text.encode("utf-8", errors="ignore"))
-    else:
-        hasher.update(b"")
-    return hasher.hexdigest()
+        return _compute_hash(payload_bytes, algo)
+    if payload_path is not None:
+        return _compute_hash_stream(payload_path, algo)
+    if payload_text is not None:
+        return _compute_hash(payload_text.encode("utf-8", errors="ignore"), algo)
+    return _compute_hash(b"", algo)
+
+
+def _with_hash_algo(metadata: dict[str, Any] | None, algo: str) -> dict[str, Any]:
+    # ПОЧЕМУ hash_algo только для не-sha256: отсутствие ключа = sha256, старые
+    # записи и их metadata не меняются; читатель перепроверяет хэш нужным алгоритмом.
+    if algo == DEFAULT_HASH_ALGO:
+        return metadata or {}
+    return {**(metadata or {}), "hash_algo": algo}
 
 
 def append_integrity_event(
@@ -62,38 +159,116 @@ def append_integrity_event(
     payload_bytes: bytes | None = None,
     payload_text: str | None = None,
     metadata: dict[str, Any] | None = None,
+    payload_path: Path | None = None,
 ) -> str:
-    """Append one event to integrity hash chain."""
+    """Append one event to integrity hash chain.
+
+    payload_path — хэшировать файл потоково вместо payload_bytes в памяти.
+    """
     ensure_integrity_tables(db_path)
-    event_id = str(uuid.uuid4())
-    content_hash = _compute_hash(payload_bytes, payload_text)
+    event_id = _uuid7()
+    algo = _resolve_hash_algo()
+    content_hash = _payload_hash(payload_bytes, payload_text, payload_path, algo)
     created_at = _now_iso()
-    metadata_json = json.dumps(metadata or {}, ensure_ascii=False)
+    metadata_json = json.dumps(_with_hash_algo(metadata, algo), ensure_ascii=False)
 
     db = get_reflexio_db(db_path)
-    row = db.fetchone(
+    # ПОЧЕМУ INSERT … SELECT со скалярным подзапросом: хвост цепочки читается
+    # и новое звено пишется одним statement'ом — один round-trip вместо
+    # SELECT + INSERT, и атомарно (autocommit), без гонки между ними.
+    db.execute(
         """
-        SELECT content_hash
-        FROM integrity_events
-        WHERE ingest_id = ?
-        ORDER BY created_at DESC, ROWID DESC
-        LIMIT 1
+        INSERT INTO integrity_events (id, ingest_id, stage, content_hash, prev_hash, metadata, created_at)
+        SELECT ?, ?, ?, ?, (
+            SELECT content_hash
+            FROM integrity_events
+            WHERE ingest_id = ?
+            ORDER BY created_at DESC, ROWID DESC
+            LIMIT 1
+        ), ?, ?
         """,
-        (ingest_id,),
+        (event_id, ingest_id, stage, content_hash, ingest_id, metadata_json, created_at),
     )
-    prev_hash = row[0] if row else None
-
-    with db.transaction():
-        db.execute(
-            """
-            INSERT INTO integrity_events (id, ingest_id, stage, content_hash, prev_hash, metadata, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (event_id, ingest_id, stage, content_hash, prev_hash, metadata_json, created_at),
-        )
     return event_id
 
 
+def append_integrity_events_batch(db_path: Path, events: list[dict[str, Any]]) -> list[str]:
+    """Append many events to integrity hash chains in one transaction.
+
+    events — dict'ы с ключами ingest_id, stage и опционально payload_bytes,
+    payload_text, payload_path, metadata (как аргументы append_integrity_event).
+    Возвращает id событий в порядке events.
+
+    ПОЧЕМУ prev_hash связывается в Python: хэши пачки считаются подряд без
+    обращений к БД, хвост цепочки читается из БД один раз на ingest_id,
+    дальше prev_hash = content_hash предыдущего события этой же пачки.
+    """
+    if not events:
+        return []
+    ensure_integrity_tables(db_path)
+    db = get_reflexio_db(db_path)
+    created_at = _now_iso()
+    algo = _resolve_hash_algo()
+    hashes = [
+        _payload_hash(
+            event.get("payload_bytes"), event.get("payload_text"), event.get("payload_path"), algo
+        )
+        for event in events
+    ]
+
+    ids: list[str] = []
+    rows: list[tuple[Any, ...]] = []
+    # ПОЧЕМУ IMMEDIATE: хвосты цепочек читаются внутри транзакции и сразу
+    # пишутся — write-lock берём заранее, чтобы параллельный appender не
+    # вклинился между чтением хвоста и вставкой.
+    with db.transaction(immediate=True):
+        # bytes — новые BLOB-хэши, str — hex-хэши из строк до перехода на BLOB
+        tails: dict[str, bytes | str | None] = {}
+        for event, content_hash in zip(events, hashes):
+            ingest_id = event["ingest_id"]
+            if ingest_id not in tails:
+                row = db.fetchone(
+                    """
+                    SELECT content_hash
+                    FROM integrity_events
+                    WHERE ingest_id = ?
+                    ORDER BY created_at DESC, ROWID DESC
+                    LIMIT 1
+                    """,
+                    (ingest_id,),
+                )
+                tails[ingest_id] = row[0] if row else None
+            event_id = _uuid7()
+            rows.append(
+                (
+                    event_id,
+                    ingest_id,
+                    event["stage"],
+                    content_hash,
+                    tails[ingest_id],
+                    json.dumps(_with_hash_algo(event.get("metadata"), algo), ensure_ascii=False),
+                    created_at,
+                )
+            )
+            tails[ingest_id] = content_hash
+            ids.append(event_id)
+        db.executemany(_SQL_INSERT_EVENT, rows)
+    return ids
+
+
+def append_integrity_events(
+    db_path: Path, ingest_id: str, stages: list[dict[str, Any]]
+) -> list[str]:
+    """Append several pipeline stages of one ingest (uploaded → transcribed → …) at once.
+
+    stages — dict'ы с ключом stage и опционально payload_bytes, payload_text,
+    payload_path, metadata. Одна транзакция и один executemany на все стадии.
+    """
+    return append_integrity_events_batch(
+        db_path, [{**stage, "ingest_id": ingest_id} for stage in stages]
+    )
+
+
 def get_ingest_integrity_report(db_path: Path, ingest_id: str) -> dict[str, Any]:
     """Return chain validation report for one ingest_id."""
     ensure_integrity_tables(db_path)
@@ -108,15 +283,19 @@ def get_ingest_integrity_report(db_path: Path, ingest_id: str) -> dict[str, Any]
         (ingest_id,),
     )
 
-    events: list[dict[str, Any]] = []
-    chain_valid = True
-    expected_prev = None
+    # ПОЧЕМУ сравнение срезов списков: цепочка валидна, если prev_hash каждого
+    # звена равен content_hash предыдущего — list == list сравнивает в C одним
+    # вызовом, без Python-ветки на каждое событие (numpy object-массивы дали бы
+    # то же поэлементное сравнение плюс зависимость в storage).
+    # Хэши — сырые 32 байта (BLOB): сравнение — memcmp, hex только в отчёте.
+    # prev_hash копирует хвост как он хранится, поэтому цепочки со старыми
+    # hex-строками (до BLOB) сверяются так же.
+    content_hashes = [row["content_hash"] for row in rows]
+    prev_hashes = [row["prev_hash"] for row in rows]
+    chain_valid = not rows or (prev_hashes[0] is None and prev_hashes[1:] == content_hashes[:-1])
 
+    events: list[dict[str, Any]] = []
     for row in rows:
-        prev_hash = row["prev_hash"]
-        if prev_hash != expected_prev:
-            chain_valid = False
-        expected_prev = row["content_hash"]
         try:
             metadata = json.loads(row["metadata"] or "{}")
         except Exception:
@@ -125,8 +304,8 @@ def get_ingest_integrity_report(db_path: Path, ingest_id: str) -> dict[str, Any]
             {
                 "id": row["id"],
                 "stage": row["stage"],
-                "content_hash": row["content_hash"],
-                "prev_hash": prev_hash,
+                "content_hash": _hash_hex(row["content_hash"]),
+                "prev_hash": _hash_hex(row["prev_hash"]),
                 "metadata": metadata,
                 "created_at": row["created_at"],
             }
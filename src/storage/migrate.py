@@ -5,8 +5,9 @@
 import sys
 import argparse
 import json
+import re
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -19,6 +20,50 @@ except Exception:
     import logging
     logger = logging.getLogger("storage.migrate")
 
+from src.utils.json_utils import json_loads
+
+try:
+    import psycopg2 as _psycopg2
+except ImportError:  # pragma: no cover — нужен только для bulk COPY
+    _psycopg2 = None
+
+# Строк на один json_group_array в _fetch_table_json
+_FETCH_CHUNK_ROWS = 5000
+
+# Колонки с JSON-строками в SQLite → JSONB в PostgreSQL
+_JSON_COLUMNS = frozenset({"segments", "parameters", "source_urls", "evidence"})
+
+# Таблицы меньше порога идут через REST insert, больше — через COPY
+_REST_MAX_ROWS = 1000
+_COPY_CHUNK_ROWS = 10_000
+
+# PostgreSQL → SQLite: замены для apply_schema_migrations
+_PG_TO_SQLITE_MAP = {
+    "UUID": "TEXT",
+    "gen_random_uuid()": "(lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))),2) || '-' || substr('89ab',abs(random()) % 4 + 1, 1) || substr(lower(hex(randomblob(2))),2) || '-' || lower(hex(randomblob(6))))",
+    "JSONB": "TEXT",
+    "TIMESTAMP WITH TIME ZONE": "TIMESTAMP",
+    "TIMESTAMPTZ": "TIMESTAMP",
+    "vector(1536)": "TEXT",  # pgvector не поддерживается в SQLite
+    "SERIAL": "INTEGER",
+    "now()": "datetime('now')",
+}
+# Длинные ключи первыми — «TIMESTAMP WITH TIME ZONE» раньше любых префиксов
+_PG_TO_SQLITE_RE = re.compile(
+    "|".join(re.escape(k) for k in sorted(_PG_TO_SQLITE_MAP, key=len, reverse=True))
+)
+
+
+def _pg_to_sqlite(sql: str) -> str:
+    """
+    Переводит PostgreSQL DDL в диалект SQLite одним проходом.
+
+    ПОЧЕМУ: раньше — 8 последовательных str.replace, каждый пересканирует
+    всю миграцию. Одна скомпилированная альтернация + lookup замены.
+    Результат тот же: ни одна замена не порождает текст другого ключа.
+    """
+    return _PG_TO_SQLITE_RE.sub(lambda m: _PG_TO_SQLITE_MAP[m.group(0)], sql)
+
 
 def backup_sqlite(backup_path: Optional[Path] = None) -> Path:
     """
@@ -47,6 +92,140 @@ def backup_sqlite(backup_path: Optional[Path] = None) -> Path:
     return backup_path
 
 
+def _sqlite_table_counts(cursor, tables: list) -> Dict[str, int]:
+    """
+    COUNT(*) по всем существующим таблицам из списка одним UNION ALL запросом.
+
+    ПОЧЕМУ: раньше — отдельный SELECT COUNT(*) на каждую таблицу (10 запросов).
+    Отсутствующие таблицы отфильтровываются через sqlite_master заранее —
+    иначе один UNION ALL падал бы целиком из-за одной таблицы.
+    Таблицы без записи в результате — отсутствуют в SQLite.
+    """
+    placeholders = ", ".join("?" * len(tables))
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",  # nosec B608 — только плейсхолдеры
+        tuple(tables),
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    present = [t for t in tables if t in existing]
+    if not present:
+        return {}
+    union_sql = " UNION ALL ".join(
+        f"SELECT '{t}', COUNT(*) FROM {t}" for t in present  # nosec B608 — table from hardcoded list
+    )
+    cursor.execute(union_sql)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def _fetch_table_json(cursor, table: str) -> list:
+    """
+    Читает таблицу как список dict, порциями по _FETCH_CHUNK_ROWS строк.
+
+    ПОЧЕМУ: раньше — fetchall() + dict(row) + json.loads по JSON-колонкам
+    для каждой строки в Python. json_group_array(json_object(...)) собирает
+    порцию внутри SQLite (C), парсим один буфер на порцию. JSON-колонки
+    разворачиваются через json() в SQL; невалидный JSON остаётся строкой,
+    как и при прежнем try/except вокруг json.loads.
+    ПОЧЕМУ порциями по rowid: агрегат по всей таблице держит её целиком одной
+    TEXT-строкой в памяти SQLite и упирается в SQLITE_MAX_LENGTH.
+    """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]  # nosec B608 — table from hardcoded list
+    if not columns:
+        return []
+    pairs = []
+    for col in columns:
+        if col in _JSON_COLUMNS:
+            value = f'CASE WHEN json_valid("{col}") THEN json("{col}") ELSE "{col}" END'
+        else:
+            value = f'"{col}"'
+        pairs.append(f"'{col}', {value}")
+    # json(obj) снаружи подзапроса: через подзапрос json_object теряет
+    # JSON-подтип, и без json() объекты попали бы в массив строками
+    sql = (
+        f"SELECT max(_rowid), json_group_array(json(_obj)) FROM ("  # nosec B608 — columns from PRAGMA, table from hardcoded list
+        f"SELECT rowid AS _rowid, json_object({', '.join(pairs)}) AS _obj FROM {table} "
+        f"WHERE rowid > ? ORDER BY rowid LIMIT ?)"
+    )
+    rows: list = []
+    last_rowid = -(2**63)
+    while True:
+        last, payload = cursor.execute(sql, (last_rowid, _FETCH_CHUNK_ROWS)).fetchone()
+        if last is None:
+            return rows
+        rows.extend(json_loads(payload))
+        last_rowid = last
+
+
+def _pg_connect():
+    """
+    Прямое подключение к Postgres Supabase для COPY.
+
+    Returns:
+        psycopg2 connection или None (нет psycopg2 / SUPABASE_DB_URL / ошибка)
+    """
+    from src.utils.config import settings
+
+    url = getattr(settings, "SUPABASE_DB_URL", None)
+    if _psycopg2 is None or not isinstance(url, str) or not url:
+        return None
+    try:
+        return _psycopg2.connect(url)
+    except Exception as e:
+        logger.warning("pg_direct_connect_failed", error=str(e))
+        return None
+
+
+def _csv_field(value: Any) -> str:
+    """
+    Поле CSV для COPY: NULL — пустое без кавычек, строки — всегда в кавычках.
+
+    ПОЧЕМУ не csv.writer: QUOTE_NONNUMERIC пишет None как "" — Postgres
+    прочитает это как пустую строку, а не NULL. dict/list → JSON (jsonb
+    принимает текст), bool → true/false.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _bulk_copy(pg_conn, table: str, columns: list, rows: list) -> int:
+    """
+    Загружает строки в Postgres через COPY ... FROM STDIN (CSV) блоками.
+
+    ПОЧЕМУ: PostgREST insert — JSON по HTTP и построчный разбор на стороне PG.
+    COPY грузит поток одной командой на блок, без JSON-декодирования запроса.
+    Поля форматирует _csv_field (NULL и пустая строка различимы).
+
+    Returns:
+        Количество загруженных строк
+    """
+    import io
+
+    column_sql = ", ".join(f'"{c}"' for c in columns)
+    copy_sql = f'COPY "{table}" ({column_sql}) FROM STDIN WITH (FORMAT csv)'  # nosec B608 — table/columns from SQLite schema
+    try:
+        with pg_conn.cursor() as pg_cursor:
+            for start in range(0, len(rows), _COPY_CHUNK_ROWS):
+                buf = io.StringIO()
+                for row in rows[start:start + _COPY_CHUNK_ROWS]:
+                    buf.write(",".join(_csv_field(row.get(c)) for c in columns))
+                    buf.write("\n")
+                buf.seek(0)
+                pg_cursor.copy_expert(copy_sql, buf)
+        pg_conn.commit()
+    except Exception:
+        # Таблица грузится целиком или никак; соединение пригодно для следующих
+        pg_conn.rollback()
+        raise
+    return len(rows)
+
+
 def verify_row_counts() -> Dict[str, Any]:
     """
     Сверяет количество строк между SQLite и Supabase.
@@ -55,7 +234,7 @@ def verify_row_counts() -> Dict[str, Any]:
         Результат проверки
     """
     result = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "tables": {},
         "match": True,
         "differences": [],
@@ -87,11 +266,14 @@ def verify_row_counts() -> Dict[str, Any]:
         tables = ["missions", "claims", "audio_meta", "text_entries", "insights", "metrics"]
         tables.extend(["ingest_queue", "transcriptions", "facts", "digests"])  # Старые таблицы
         
+        sqlite_counts = _sqlite_table_counts(cursor, tables)
+
         for table in tables:
             try:
                 # SQLite count
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")  # nosec B608 — table from hardcoded list
-                sqlite_count = cursor.fetchone()[0]
+                if table not in sqlite_counts:
+                    raise sqlite3.OperationalError(f"no such table: {table}")
+                sqlite_count = sqlite_counts[table]
 
                 # Supabase count
                 response = supabase.table(table).select("*", count="exact").limit(1).execute()
@@ -150,7 +332,7 @@ def migrate_to_supabase(dry_run: bool = False) -> Dict[str, Any]:
         Результат миграции
     """
     result = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "dry_run": dry_run,
         "status": "pending",
         "tables": {},
@@ -184,6 +366,8 @@ def migrate_to_supabase(dry_run: bool = False) -> Dict[str, Any]:
             return result
         
         conn = None
+        pg_conn = None
+        pg_tried = False
         try:
             conn = sqlite3.connect(str(sqlite_path))
             conn.row_factory = sqlite3.Row
@@ -195,15 +379,17 @@ def migrate_to_supabase(dry_run: bool = False) -> Dict[str, Any]:
                 "missions", "claims", "audio_meta", "text_entries", "insights", "metrics"  # Новые таблицы
             ]
         
+            sqlite_counts = _sqlite_table_counts(cursor, tables)
+
             for table in tables:
+                result["tables"][table] = {
+                    "sqlite_count": sqlite_counts.get(table, 0),
+                    "migrated": False,
+                }
                 try:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")  # nosec B608 — table from hardcoded list
-                    count = cursor.fetchone()[0]
-                
-                    result["tables"][table] = {
-                        "sqlite_count": count,
-                        "migrated": False,
-                    }
+                    if table not in sqlite_counts:
+                        raise sqlite3.OperationalError(f"no such table: {table}")
+                    count = sqlite_counts[table]
                 
                     if count == 0:
                         logger.info(f"Skipping empty table: {table}")
@@ -214,32 +400,19 @@ def migrate_to_supabase(dry_run: bool = False) -> Dict[str, Any]:
                         logger.info(f"[DRY RUN] Would migrate {count} rows from {table}")
                         continue
                 
-                    # Читаем данные
-                    cursor.execute(f"SELECT * FROM {table}")  # nosec B608 — table from hardcoded list
-                    rows = cursor.fetchall()
-                
-                    # Конвертируем в словари
-                    data = [dict(row) for row in rows]
+                    # Читаем данные сразу как JSON (JSON-колонки уже развёрнуты)
+                    data = _fetch_table_json(cursor, table)
                 
-                    # Конвертируем данные для PostgreSQL
-                    for row in data:
-                        # JSON строки → JSONB
-                        for key in ["segments", "parameters", "source_urls", "evidence"]:
-                            if key in row and row[key] and isinstance(row[key], str):
-                                try:
-                                    row[key] = json.loads(row[key])
-                                except Exception:
-                                    pass
-                    
-                        # TEXT ID → UUID (если нужно)
-                        if "id" in row and isinstance(row["id"], str) and len(row["id"]) != 36:
-                            # Оставляем как есть, Supabase примет
-                            pass
-                
-                    # Вставляем в Supabase
+                    # Вставляем в Supabase: большие таблицы — COPY, мелкие — REST
                     if data:
-                        response = supabase.table(table).insert(data).execute()
-                        migrated_count = len(response.data) if response.data else len(data)
+                        if len(data) >= _REST_MAX_ROWS and pg_conn is None and not pg_tried:
+                            pg_tried = True
+                            pg_conn = _pg_connect()
+                        if len(data) >= _REST_MAX_ROWS and pg_conn is not None:
+                            migrated_count = _bulk_copy(pg_conn, table, list(data[0]), data)
+                        else:
+                            response = supabase.table(table).insert(data).execute()
+                            migrated_count = len(response.data) if response.data else len(data)
                         result["tables"][table]["migrated"] = True
                         result["tables"][table]["supabase_count"] = migrated_count
                     
@@ -254,6 +427,8 @@ def migrate_to_supabase(dry_run: bool = False) -> Dict[str, Any]:
         finally:
             if conn is not None:
                 conn.close()
+            if pg_conn is not None:
+                pg_conn.close()
         
     except Exception as e:
         logger.error("migration_failed", error=str(e))
@@ -274,7 +449,7 @@ def apply_schema_migrations(backend: str = "supabase") -> Dict[str, Any]:
         Результат применения миграций
     """
     result = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "backend": backend,
         "migrations_applied": [],
         "errors": [],
@@ -348,17 +523,8 @@ def apply_schema_migrations(backend: str = "supabase") -> Dict[str, Any]:
                     conn = sqlite3.connect(str(db_path))
                     cursor = conn.cursor()
                 
-                    # Адаптируем SQL для SQLite
-                    sqlite_sql = migration_sql
-                    # Убираем PostgreSQL-специфичные конструкции
-                    sqlite_sql = sqlite_sql.replace("UUID", "TEXT")
-                    sqlite_sql = sqlite_sql.replace("gen_random_uuid()", "(lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))),2) || '-' || substr('89ab',abs(random()) % 4 + 1, 1) || substr(lower(hex(randomblob(2))),2) || '-' || lower(hex(randomblob(6))))")
-                    sqlite_sql = sqlite_sql.replace("JSONB", "TEXT")
-                    sqlite_sql = sqlite_sql.replace("TIMESTAMP WITH TIME ZONE", "TIMESTAMP")
-                    sqlite_sql = sqlite_sql.replace("TIMESTAMPTZ", "TIMESTAMP")
-                    sqlite_sql = sqlite_sql.replace("vector(1536)", "TEXT")  # pgvector не поддерживается в SQLite
-                    sqlite_sql = sqlite_sql.replace("SERIAL", "INTEGER")
-                    sqlite_sql = sqlite_sql.replace("now()", "datetime('now')")
+                    # Адаптируем SQL для SQLite (PostgreSQL-специфичные конструкции)
+                    sqlite_sql = _pg_to_sqlite(migration_sql)
                 
                     # Убираем RLS политики (не поддерживаются в SQLite)
                     if "0003_rls_policies" in migration_file.name:
@@ -8,6 +8,9 @@ CREATE INDEX IF NOT EXISTS idx_claims_text_search ON claims USING gin(to_tsvecto
 
 -- Composite indexes для частых запросов
 CREATE INDEX IF NOT EXISTS idx_facts_timestamp_confidence ON facts(timestamp DESC, confidence DESC);
+CREATE INDEX IF NOT EXISTS idx_facts_transcription_timestamp ON facts(transcription_id, timestamp);
+-- Покрыт левым префиксом idx_facts_transcription_timestamp — лишний overhead на запись
+DROP INDEX IF EXISTS idx_facts_transcription;
 CREATE INDEX IF NOT EXISTS idx_claims_validated_confidence ON claims(validated, confidence DESC);
 CREATE INDEX IF NOT EXISTS idx_ingest_status_created ON ingest_queue(status, created_at DESC);
 
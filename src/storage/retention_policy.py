@@ -2,9 +2,12 @@
 Retention Policy — автоматическое удаление старых файлов.
 Reflexio v2.1 — Surpass Smart Noter Sprint
 """
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Dict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
 
 from src.utils.logging import get_logger
 from src.storage.audio_manager import get_audio_manager
@@ -12,8 +15,36 @@ from src.storage.audio_manager import get_audio_manager
 logger = get_logger("storage.retention")
 
 
+@lru_cache(maxsize=None)
+def _delete_batch_sql(table: str, ts_column: str) -> str:
+    """
+    SQL пачки retention-DELETE для пары (таблица, колонка времени).
+
+    ПОЧЕМУ кэш: текст запроса один и тот же между запусками — строим один
+    раз на процесс, и кэш prepared statements SQLite попадает по тексту.
+    Имена проверяются здесь же — тоже один раз на пару; невалидная пара
+    бросает ValueError и в кэш не попадает.
+    DELETE ... LIMIT требует SQLITE_ENABLE_UPDATE_DELETE_LIMIT, поэтому —
+    переносимый вариант через rowid IN (SELECT ... LIMIT).
+    """
+    from src.storage.db import validate_table_name
+
+    validate_table_name(table)
+    if not ts_column.replace("_", "").isalnum():
+        raise ValueError(f"Invalid column name: {ts_column}")
+    return (
+        f"DELETE FROM {table} WHERE rowid IN "  # nosec B608 — table/column validated above
+        f"(SELECT rowid FROM {table} WHERE {ts_column} < ? LIMIT ?)"
+    )
+
+
 class RetentionPolicy:
     """Политика хранения данных."""
+
+    # Размер пачки для удаления старых строк (одна транзакция на пачку)
+    DELETE_BATCH_SIZE = 5000
+    # Сколько свободных страниц возвращать ОС за один запуск очистки
+    VACUUM_PAGES_PER_RUN = 1000
     
     def __init__(
         self,
@@ -32,6 +63,29 @@ class RetentionPolicy:
         self.digest_retention_days = digest_retention_days
         
         self.audio_manager = get_audio_manager()
+        # ПОЧЕМУ лениво и один раз: get_db() на каждый вызов создаёт новый
+        # SQLiteBackend — новое соединение с повторными PRAGMA и холодным кэшем.
+        self._db = None
+
+    def _get_db(self):
+        """Бэкенд БД, создаётся при первом обращении и переиспользуется."""
+        if self._db is None:
+            from src.storage.db import get_db
+            self._db = get_db()
+        return self._db
+
+    def close(self) -> None:
+        """Закрывает соединение с БД, если оно было открыто."""
+        conn = getattr(self._db, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._db = None
+
+    def __enter__(self) -> "RetentionPolicy":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def cleanup_audio(self) -> int:
         """Очищает истёкшие аудио файлы."""
@@ -40,16 +94,25 @@ class RetentionPolicy:
         
         return self.audio_manager.cleanup_expired()
     
-    def cleanup_transcriptions(self) -> int:
-        """Очищает старые транскрипции."""
-        if self.transcription_retention_days == 0:
+    def cleanup_transcriptions(self, purge_all: bool = False) -> int:
+        """
+        Очищает старые транскрипции.
+
+        Args:
+            purge_all: удалить все транскрипции независимо от срока хранения
+        """
+        if self.transcription_retention_days == 0 and not purge_all:
             return 0
         
         try:
-            from src.storage.db import get_db
-            db = get_db()
+            db = self._get_db()
             
-            cutoff_date = datetime.now() - timedelta(days=self.transcription_retention_days)
+            # ПОЧЕМУ UTC ISO-строка: created_at пишется как datetime.now(timezone.utc).isoformat();
+            # TEXT против TEXT того же формата — сравнение по индексу без приведения типов
+            # и без сдвига на локальный часовой пояс.
+            cutoff = (
+                datetime.now(timezone.utc) - timedelta(days=self.transcription_retention_days)
+            ).isoformat()
             
             # Удаляем старые транскрипции (если таблица существует)
             # Это зависит от структуры БД
@@ -57,13 +120,15 @@ class RetentionPolicy:
             
             # Пример для SQLite
             if hasattr(db, "conn"):
-                cursor = db.conn.cursor()
-                cursor.execute(
-                    "DELETE FROM transcriptions WHERE created_at < ?",
-                    (cutoff_date.isoformat(),)
-                )
-                deleted_count = cursor.rowcount
-                db.conn.commit()
+                truncated = self._truncate_if_all_expired(db.conn, cutoff, purge_all)
+                if truncated is not None:
+                    deleted_count = truncated
+                else:
+                    deleted_count = self._delete_in_batches(
+                        db.conn, "transcriptions", "created_at", cutoff
+                    )
+                if deleted_count:
+                    self._incremental_vacuum(db.conn)
             
             logger.info("transcriptions_cleaned", deleted_count=deleted_count)
             return deleted_count
@@ -72,6 +137,74 @@ class RetentionPolicy:
             logger.error("transcription_cleanup_failed", error=str(e))
             return 0
     
+    def _truncate_if_all_expired(self, conn, cutoff: str, purge_all: bool) -> Optional[int]:
+        """
+        Удаляет все транскрипции, если ни одна не переживает cutoff.
+
+        Returns:
+            Число удалённых строк или None, если есть строки, которые нужно
+            сохранить (тогда удаляем пачками).
+
+        ПОЧЕМУ DELETE без WHERE: под удаление попадает вся таблица — SQLite
+        компилирует его в OP_Clear (truncate), без обхода строк.
+        ПОЧЕМУ BEGIN IMMEDIATE: ingest пишет через другое соединение; проверка
+        и DELETE в одной транзакции с write-lock — иначе транскрипция,
+        записанная между ними, будет стёрта.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not purge_all and self._has_rows_to_keep(conn, cutoff):
+                conn.commit()
+                return None
+            deleted: int = conn.execute("DELETE FROM transcriptions").rowcount
+            conn.commit()
+            return deleted
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _has_rows_to_keep(self, conn, cutoff: str) -> bool:
+        """Есть ли транскрипции, не попадающие под cutoff (включая created_at IS NULL)."""
+        row = conn.execute(
+            "SELECT 1 FROM transcriptions WHERE created_at >= ? OR created_at IS NULL LIMIT 1",
+            (cutoff,),
+        ).fetchone()
+        return row is not None
+
+    def _delete_in_batches(self, conn, table: str, ts_column: str, cutoff: str) -> int:
+        """
+        Удаляет строки старше cutoff пачками по DELETE_BATCH_SIZE.
+
+        ПОЧЕМУ: один DELETE без границ по многолетней таблице держит write-lock
+        секундами и раздувает WAL. Пачка = отдельная короткая транзакция.
+        """
+        sql = _delete_batch_sql(table, ts_column)
+        deleted: int = 0
+        while True:
+            cursor = conn.execute(sql, (cutoff, self.DELETE_BATCH_SIZE))
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.DELETE_BATCH_SIZE:
+                return deleted
+
+    def _incremental_vacuum(self, conn) -> None:
+        """
+        Возвращает ОС до VACUUM_PAGES_PER_RUN свободных страниц после удаления.
+
+        ПОЧЕМУ не VACUUM: полный VACUUM переписывает весь файл под эксклюзивной
+        блокировкой. incremental_vacuum(N) двигает не больше N страниц; на БД
+        без auto_vacuum=INCREMENTAL — no-op. executescript, а не execute:
+        execute делает один шаг PRAGMA и освобождает только одну страницу.
+        """
+        freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.executescript(f"PRAGMA incremental_vacuum({int(self.VACUUM_PAGES_PER_RUN)});")
+        freelist_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        logger.info(
+            "incremental_vacuum",
+            freelist_before=freelist_before,
+            freelist_after=freelist_after,
+        )
+
     def cleanup_digests(self) -> int:
         """Очищает старые дайджесты."""
         if self.digest_retention_days == 0:
@@ -82,29 +215,32 @@ class RetentionPolicy:
             if not digests_dir.exists():
                 return 0
             
-            cutoff_date = datetime.now() - timedelta(days=self.digest_retention_days)
+            cutoff = (datetime.now() - timedelta(days=self.digest_retention_days)).date()
             deleted_count = 0
             
-            for digest_file in digests_dir.glob("digest_*.md"):
-                try:
-                    # Извлекаем дату из имени файла
-                    date_str = digest_file.stem.replace("digest_", "")
-                    file_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                    
-                    if file_date < cutoff_date.date():
-                        digest_file.unlink()
-                        # Удаляем соответствующий JSON и PDF если есть
-                        json_file = digest_file.with_suffix(".json")
-                        pdf_file = digest_file.with_suffix(".pdf")
-                        if json_file.exists():
-                            json_file.unlink()
-                        if pdf_file.exists():
-                            pdf_file.unlink()
-                        
-                        deleted_count += 1
-                        
-                except Exception as e:
-                    logger.warning("digest_cleanup_file_failed", file=str(digest_file), error=str(e))
+            # ПОЧЕМУ scandir + срез имени: glob + Path-объекты + два exists() на файл —
+            # лишние stat() и аллокации. Дата берётся из имени digest_YYYY-MM-DD.md,
+            # соседние .json/.pdf удаляются без предварительной проверки.
+            with os.scandir(digests_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not (name.startswith("digest_") and name.endswith(".md")):
+                        continue
+                    try:
+                        if date.fromisoformat(name[7:-3]) < cutoff:
+                            os.unlink(entry.path)
+                            # Удаляем соответствующий JSON и PDF если есть
+                            base = entry.path[:-3]
+                            for sibling in (base + ".json", base + ".pdf"):
+                                try:
+                                    os.unlink(sibling)
+                                except FileNotFoundError:
+                                    pass
+                            
+                            deleted_count += 1
+                            
+                    except Exception as e:
+                        logger.warning("digest_cleanup_file_failed", file=entry.path, error=str(e))
             
             logger.info("digests_cleaned", deleted_count=deleted_count)
             return deleted_count
@@ -115,11 +251,38 @@ class RetentionPolicy:
     
     def cleanup_all(self) -> Dict[str, int]:
         """Выполняет полную очистку всех типов данных."""
-        return {
-            "audio": self.cleanup_audio(),
-            "transcriptions": self.cleanup_transcriptions(),
-            "digests": self.cleanup_digests(),
-        }
+        # ПОЧЕМУ параллельно: аудио, SQLite и дайджесты — независимые ресурсы,
+        # и время очистки ≈ максимум из трёх, а не сумма. Транскрипции остаются
+        # в вызывающем потоке: соединение self._db живёт дольше пула и
+        # используется в _optimize() ниже.
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="retention") as pool:
+            audio = pool.submit(self.cleanup_audio)
+            digests = pool.submit(self.cleanup_digests)
+            transcriptions = self.cleanup_transcriptions()
+            result = {
+                "audio": audio.result(),
+                "transcriptions": transcriptions,
+                "digests": digests.result(),
+            }
+        if result["transcriptions"]:
+            self._optimize()
+        return result
+
+    def _optimize(self) -> None:
+        """
+        PRAGMA optimize после массового удаления.
+
+        ПОЧЕМУ: после DELETE большой части таблицы статистика планировщика
+        устаревает; optimize пересобирает её только там, где это нужно
+        (дёшево, в отличие от полного ANALYZE).
+        """
+        conn = getattr(self._db, "conn", None)
+        if conn is None:
+            return
+        try:
+            conn.execute("PRAGMA optimize")
+        except Exception as e:
+            logger.warning("retention_optimize_failed", error=str(e))
 
 
 def get_retention_policy() -> RetentionPolicy:
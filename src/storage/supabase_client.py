@@ -1,6 +1,8 @@
 """Клиент для работы с Supabase."""
 import os
-from typing import Optional, Dict, Any, TYPE_CHECKING, cast
+import time
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING, cast
 
 from src.utils.logging import get_logger
 
@@ -17,10 +19,37 @@ if TYPE_CHECKING:
 else:
     ClientType = Any
 
+# Успешный результат test_connection переиспользуется столько секунд
+CONNECTION_CHECK_TTL_SECONDS = 60.0
+
+# (monotonic-время проверки, клиент, результат) последней успешной проверки
+_last_ok_check: Optional[Tuple[float, Any, Dict[str, Any]]] = None
+
+
+@lru_cache(maxsize=4)
+def _create_client(supabase_url: str, supabase_key: str) -> "ClientType":
+    """
+    Клиент Supabase под пару (url, key).
+
+    ПОЧЕМУ кэш: create_client поднимает HTTP-клиент; пересоздание на каждом
+    вызове (health-check, SupabaseBackend) — новый DNS+TCP+TLS. Ключ кэша —
+    сами значения env, поэтому смена конфигурации даёт новый клиент.
+    Исключения lru_cache не кэширует — неудачное создание повторится.
+    """
+    return cast("ClientType", create_client(supabase_url, supabase_key))
+
+
+@lru_cache(maxsize=1)
+def _http_session():
+    """Общая requests.Session для fallback-проверки (keep-alive)."""
+    import requests
+
+    return requests.Session()
+
 
 def get_supabase_client() -> Optional["ClientType"]:
     """
-    Создаёт и возвращает клиент Supabase.
+    Возвращает клиент Supabase (один на пару URL/ключ).
     
     Returns:
         Клиент Supabase или None, если не настроен
@@ -35,7 +64,7 @@ def get_supabase_client() -> Optional["ClientType"]:
         return None
     
     try:
-        return cast("ClientType", create_client(supabase_url, supabase_key))
+        return _create_client(supabase_url, supabase_key)
     except Exception as e:
         logger.warning("supabase_client_create_failed", error=str(e))
         return None
@@ -44,6 +73,9 @@ def get_supabase_client() -> Optional["ClientType"]:
 def test_connection() -> Dict[str, Any]:
     """
     Проверяет подключение к Supabase.
+
+    Успешный результат для того же клиента кэшируется на
+    CONNECTION_CHECK_TTL_SECONDS, чтобы частые health-пробы не били в Supabase.
     
     Returns:
         Словарь с результатами проверки
@@ -61,7 +93,21 @@ def test_connection() -> Dict[str, Any]:
             "status": "error",
             "error": "Supabase not configured. Set SUPABASE_URL and SUPABASE_ANON_KEY"
         }
-    
+
+    global _last_ok_check
+    if _last_ok_check is not None:
+        checked_at, checked_client, checked_result = _last_ok_check
+        if checked_client is client and time.monotonic() - checked_at < CONNECTION_CHECK_TTL_SECONDS:
+            return dict(checked_result)
+
+    result = _probe_connection(client)
+    if result["status"] == "ok":
+        _last_ok_check = (time.monotonic(), client, result)
+    return result
+
+
+def _probe_connection(client: "ClientType") -> Dict[str, Any]:
+    """Один реальный запрос к Supabase: _health, затем REST API."""
     try:
         # Простая проверка через запрос к базе данных
         response = client.table("_health").select("status").limit(1).execute()
@@ -73,8 +119,7 @@ def test_connection() -> Dict[str, Any]:
         # Если таблицы _health нет, пробуем просто подключиться
         try:
             # Пробуем запрос к REST API
-            import requests
-            response = requests.get(
+            response = _http_session().get(
                 f"{os.getenv('SUPABASE_URL')}/rest/v1/",
                 headers={"apikey": os.getenv("SUPABASE_ANON_KEY", "")},
                 timeout=5
@@ -2,21 +2,78 @@
 Chain of Density (CoD) — постепенное уплотнение саммари.
 Reflexio 24/7 — November 2025 Integration Sprint
 """
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 import json
 
 from src.utils.logging import get_logger
 from src.llm.providers import get_llm_client
 from src.summarizer.prompts import get_chain_of_density_prompt
+from src.utils.json_utils import extract_json_objects, json_loads
 
 logger = get_logger("summarizer.cod")
 
+# ПОЧЕМУ явный язык: без указания LLM галлюцинирует на случайных языках
+# когда входной текст — шум (короткие фразы "you you you").
+_SYSTEM_PROMPT = (
+    "Ты — эксперт по созданию информационно-плотных саммари. "
+    "ВСЕГДА отвечай на русском языке. Игнорируй бессмысленные повторы и шум. "
+    "Если входной текст не содержит осмысленной информации, верни пустое саммари."
+)
+
+
+@lru_cache(maxsize=8)
+def _client_for(model: str):
+    """
+    Клиент LLM под конкретную модель (None если модель не распознана).
+
+    ПОЧЕМУ кэш: SDK-клиент держит пул HTTP-соединений; пересоздание на каждый
+    вызов CoD означает новый TCP+TLS handshake.
+    """
+    from src.llm.providers import OpenAIClient, AnthropicClient
+
+    if model.startswith("gpt") or model.startswith("o1"):
+        return OpenAIClient(model=model)
+    if model.startswith("claude"):
+        return AnthropicClient(model=model)
+    return None
+
+
+def _strip_code_fence(text: str) -> str:
+    """Снимает обёртку ```json ... ``` / ``` ... ``` если она есть."""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+def _parse_iterations(text: str) -> List[Dict[str, Any]]:
+    """
+    Извлекает итерации CoD из ответа LLM.
+
+    Принимает JSON-массив, одиночный объект или несколько объектов вперемешку
+    с текстом ("Итерация N:\n{...}"). Возвращает объекты с ключом "summary"
+    в порядке появления (последний — самый плотный).
+    """
+    text = _strip_code_fence(text)
+    try:
+        parsed = json_loads(text)
+    except json.JSONDecodeError:
+        parsed = extract_json_objects(text)
+    if isinstance(parsed, dict):
+        parsed = parsed.get("iterations", [parsed])
+    if not isinstance(parsed, list):
+        return []
+    return [item for item in parsed if isinstance(item, dict) and "summary" in item]
+
 
 def generate_dense_summary(
     text: str,
     iterations: int = 5,
     model: Optional[str] = None,
     include_emotions: bool = True,
+    fused: bool = True,
 ) -> Dict[str, Any]:
     """
     Генерирует информационно-плотное саммари через Chain of Density.
@@ -25,6 +82,12 @@ def generate_dense_summary(
         text: Исходный текст
         iterations: Количество итераций уплотнения
         model: Модель LLM (если None, используется из конфигурации)
+        include_emotions: Добавлять эмоциональный контекст в промпт
+        fused: Все итерации одним вызовом LLM (False — старый цикл по вызову
+            на итерацию, оставлен для регрессионного сравнения). По умолчанию
+            True — осознанно: форма результата та же, но итерации строит один
+            ответ модели, а не N независимых. Вызывающим, которым важна
+            прежняя семантика, — передавать fused=False.
         
     Returns:
         {
@@ -61,17 +124,39 @@ def generate_dense_summary(
     
     # Если указана модель, обновляем клиент
     if model:
-        from src.llm.providers import OpenAIClient, AnthropicClient
-        
-        if model.startswith("gpt") or model.startswith("o1"):
-            client = OpenAIClient(model=model)
-        elif model.startswith("claude"):
-            client = AnthropicClient(model=model)
+        client = _client_for(model) or client
     
-    iterations_results = []
+    # ПОЧЕМУ колонки, а не список dict: лучшая итерация ищется max() по списку
+    # чисел, dict-представление собирается один раз при возврате.
+    summaries: List[str] = []
+    scores: List[float] = []
+    entities: List[List[Any]] = []
+    key_facts: List[List[Any]] = []
     current_summary = ""
-    
-    for i in range(iterations):
+
+    if fused:
+        # ПОЧЕМУ один вызов: промпт + текст одинаковы во всех итерациях, и
+        # prefill доминирует в стоимости вызова — просим сразу массив итераций.
+        prompt = get_chain_of_density_prompt(text, iterations=iterations, fused=True)
+        prompt += emotions_context
+        response = client.call(prompt, system_prompt=_SYSTEM_PROMPT)
+        if response.get("error"):
+            logger.error("cod_iteration_failed", iteration=0, error=response["error"])
+        else:
+            fused_results = _parse_iterations(response["text"])[:iterations]
+            if not fused_results:
+                logger.warning("cod_json_parse_failed", iteration=0, error="No valid JSON with 'summary' key found")
+                # Используем текст как есть
+                fused_results = [{"summary": response["text"], "density_score": 0.0}]
+            for item in fused_results:
+                current_summary = item.get("summary", current_summary)
+                summaries.append(current_summary)
+                scores.append(item.get("density_score", 0.0))
+                entities.append(item.get("entities", []))
+                key_facts.append(item.get("key_facts", []))
+            logger.info("cod_fused_complete", iterations=len(summaries))
+
+    for i in range(0 if fused else iterations):
         prompt = get_chain_of_density_prompt(text, iterations=iterations)
         
         # Добавляем эмоциональный контекст
@@ -81,16 +166,7 @@ def generate_dense_summary(
         if i > 0:
             prompt += f"\n\nТекущее саммари (итерация {i}):\n{current_summary}\n\nУплотни это саммари, добавив конкретные детали и учитывая эмоциональный контекст."
         
-        # ПОЧЕМУ явный язык: без указания LLM галлюцинирует на случайных языках
-        # когда входной текст — шум (короткие фразы "you you you").
-        response = client.call(
-            prompt,
-            system_prompt=(
-                "Ты — эксперт по созданию информационно-плотных саммари. "
-                "ВСЕГДА отвечай на русском языке. Игнорируй бессмысленные повторы и шум. "
-                "Если входной текст не содержит осмысленной информации, верни пустое саммари."
-            ),
-        )
+        response = client.call(prompt, system_prompt=_SYSTEM_PROMPT)
         
         if response.get("error"):
             logger.error("cod_iteration_failed", iteration=i, error=response["error"])
@@ -100,39 +176,26 @@ def generate_dense_summary(
             # ПОЧЕМУ: LLM может вернуть JSON в разных обёртках:
             # 1. ```json ... ```  2. ```...```  3. Итерация N:\n{...}  4. Просто {..}
             # Ищем первый валидный JSON-объект в ответе.
-            result_text = response["text"]
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+            result_text = _strip_code_fence(response["text"])
 
             # Если не JSON — ищем последний {...} блок (самая плотная итерация)
             result = None
             try:
-                result = json.loads(result_text)
+                result = json_loads(result_text)
             except json.JSONDecodeError:
-                # Ищем все JSON-объекты в тексте
-                import re
-                json_blocks = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', result_text)
-                for block in reversed(json_blocks):  # берём последний (самый плотный)
-                    try:
-                        result = json.loads(block)
-                        if "summary" in result:
-                            break
-                    except json.JSONDecodeError:
-                        continue
+                # Ищем все JSON-объекты в тексте, берём последний (самый плотный)
+                for block in reversed(extract_json_objects(result_text)):
+                    if isinstance(block, dict) and "summary" in block:
+                        result = block
+                        break
 
             if not result or "summary" not in result:
                 raise json.JSONDecodeError("No valid JSON with 'summary' key found", result_text, 0)
             current_summary = result.get("summary", current_summary)
-            
-            iterations_results.append({
-                "iteration": i + 1,
-                "summary": current_summary,
-                "density_score": result.get("density_score", 0.0),
-                "entities": result.get("entities", []),
-                "key_facts": result.get("key_facts", []),
-            })
+            summaries.append(current_summary)
+            scores.append(result.get("density_score", 0.0))
+            entities.append(result.get("entities", []))
+            key_facts.append(result.get("key_facts", []))
             
             logger.info(
                 "cod_iteration_complete",
@@ -144,20 +207,38 @@ def generate_dense_summary(
             logger.warning("cod_json_parse_failed", iteration=i, error=str(e))
             # Используем текст как есть
             current_summary = response["text"]
-            iterations_results.append({
-                "iteration": i + 1,
-                "summary": current_summary,
-                "density_score": 0.0,
-            })
-    
+            summaries.append(current_summary)
+            scores.append(0.0)
+            entities.append([])
+            key_facts.append([])
+
+    iterations_results = [
+        {
+            "iteration": i + 1,
+            "summary": summaries[i],
+            "density_score": scores[i],
+            "entities": entities[i],
+            "key_facts": key_facts[i],
+        }
+        for i in range(len(summaries))
+    ]
+    if not scores:
+        return {
+            "summary": current_summary,
+            "density_score": 0.0,
+            "iterations": iterations_results,
+            "entities": [],
+            "key_facts": [],
+        }
+
     # Выбираем лучшую итерацию (с максимальным density_score)
-    best_iteration = max(iterations_results, key=lambda x: x.get("density_score", 0.0), default={})
-    
+    best = max(range(len(scores)), key=scores.__getitem__)
+
     return {
-        "summary": best_iteration.get("summary", current_summary),
-        "density_score": best_iteration.get("density_score", 0.0),
+        "summary": summaries[best],
+        "density_score": scores[best],
         "iterations": iterations_results,
-        "entities": best_iteration.get("entities", []),
-        "key_facts": best_iteration.get("key_facts", []),
+        "entities": entities[best],
+        "key_facts": key_facts[best],
     }
 
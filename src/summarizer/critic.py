@@ -10,12 +10,20 @@ from src.summarizer.refiner import refine_summary
 
 logger = get_logger("summarizer.critic")
 
+# ПОЧЕМУ отдельный порог: factual_consistency и coherence в эвристиках —
+# заглушки 0.8, поэтому эвристический confidence зажат в [0.68, 0.78] и
+# зависит только от compression ratio. Общий порог 0.85 отправлял бы в refine
+# каждое саммари; 0.7 ловит лишь вырожденное сжатие (<10% или >90% оригинала).
+HEURISTIC_REFINE_THRESHOLD = 0.7
+
 
 def validate_summary(
     summary: str,
     original_text: str,
     confidence_threshold: float = 0.85,
     auto_refine: bool = True,
+    fast_gate: bool = False,
+    heuristic_threshold: float = HEURISTIC_REFINE_THRESHOLD,
 ) -> Dict[str, Any]:
     """
     Валидирует саммари через DeepConf и при необходимости улучшает.
@@ -25,6 +33,9 @@ def validate_summary(
         original_text: Исходный текст
         confidence_threshold: Порог confidence для запуска refiner
         auto_refine: Автоматически улучшать при низком confidence
+        fast_gate: Решать о refine и выборе версии по эвристикам, LLM-критик —
+            один раз на итоговом саммари (False — LLM-оценка каждой версии)
+        heuristic_threshold: Порог эвристического confidence для refine при fast_gate
         
     Returns:
         {
@@ -39,7 +50,9 @@ def validate_summary(
     logger.info("validating_summary", summary_length=len(summary))
     
     # Рассчитываем DeepConf метрики
-    metrics = calculate_confidence_score(summary, original_text, use_llm=True)
+    # ПОЧЕМУ эвристики для гейта: LLM-критик — доминирующая задержка пайплайна;
+    # при refine он вызывался дважды (оригинал + улучшенная версия).
+    metrics = calculate_confidence_score(summary, original_text, use_llm=not fast_gate)
     confidence = metrics["confidence_score"]
     token_entropy = metrics["token_entropy"]
     
@@ -53,14 +66,15 @@ def validate_summary(
     }
     
     # Проверяем, нужно ли улучшать
-    if should_refine(confidence, confidence_threshold) and auto_refine:
-        logger.info("refining_summary", confidence=confidence, threshold=confidence_threshold)
+    threshold = heuristic_threshold if fast_gate else confidence_threshold
+    if should_refine(confidence, threshold) and auto_refine:
+        logger.info("refining_summary", confidence=confidence, threshold=threshold)
         
         try:
             refined_summary = refine_summary(summary, original_text)
             
             # Пересчитываем метрики для улучшенного саммари
-            refined_metrics = calculate_confidence_score(refined_summary, original_text, use_llm=True)
+            refined_metrics = calculate_confidence_score(refined_summary, original_text, use_llm=not fast_gate)
             refined_confidence = refined_metrics["confidence_score"]
             
             # Используем улучшенное саммари, если оно лучше
@@ -84,6 +98,13 @@ def validate_summary(
             logger.error("refinement_failed", error=str(e))
             result["refinement_reason"] = f"Refinement failed: {str(e)}"
     
+    if fast_gate:
+        # Единственный вызов LLM-критика — на итоговой версии саммари
+        final_metrics = calculate_confidence_score(result["summary"], original_text, use_llm=True)
+        result["confidence_score"] = final_metrics["confidence_score"]
+        result["token_entropy"] = final_metrics["token_entropy"]
+        result["metrics"] = final_metrics
+    
     return result
 
 
@@ -5,14 +5,21 @@ Reflexio 24/7 — November 2025 Integration Sprint
 from typing import Dict, Any
 import json
 import math
+import re
 from collections import Counter
+from functools import lru_cache
 
 from src.utils.logging import get_logger
 from src.llm.providers import get_llm_client
 from src.summarizer.prompts import get_critic_prompt
+from src.utils.json_utils import extract_json_objects, json_loads
 
 logger = get_logger("summarizer.deepconf")
 
+# Длинные тексты токенизируем потоково — без списка всех токенов и копии lower()
+_STREAM_TOKENIZE_MIN_CHARS = 64 * 1024
+_TOKEN_RE = re.compile(r"\S+")
+
 
 def calculate_token_entropy(text: str) -> float:
     """
@@ -26,29 +33,91 @@ def calculate_token_entropy(text: str) -> float:
     """
     if not text:
         return 0.0
-    
+    return _token_entropy(text)
+
+
+# ПОЧЕМУ кэш: validate_summary оценивает одно и то же саммари повторно
+# (эвристика + LLM-путь, fallback на эвристику) — токенизация и подсчёт
+# частот нужны один раз на текст.
+@lru_cache(maxsize=128)
+def _token_entropy(text: str) -> float:
     # Простая токенизация (можно заменить на более сложную)
-    tokens = text.lower().split()
+    token_counts = _count_tokens(text)
+    total_tokens = sum(token_counts.values())
     
-    if len(tokens) < 2:
+    if total_tokens < 2:
         return 0.0
     
-    # Подсчитываем частоты
-    token_counts = Counter(tokens)
-    total_tokens = len(tokens)
+    unique_tokens = len(token_counts)
+    if unique_tokens < 2:
+        return 0.0
     
-    # Рассчитываем энтропию Шеннона
-    entropy = 0.0
-    for count in token_counts.values():
-        probability = count / total_tokens
-        if probability > 0:
-            entropy -= probability * math.log2(probability)
+    # Энтропия Шеннона в замкнутой форме: H = log2(N) - Σ c·log2(c) / N —
+    # одна сумма по частотам без деления на каждом шаге
+    entropy = math.log2(total_tokens) - sum(c * math.log2(c) for c in token_counts.values()) / total_tokens
     
     # Нормализуем (максимальная энтропия = log2(unique_tokens))
-    max_entropy = math.log2(len(token_counts)) if len(token_counts) > 1 else 1.0
-    normalized_entropy = entropy / max_entropy if max_entropy > 0 else 0.0
+    normalized_entropy = entropy / math.log2(unique_tokens)
     
-    return min(normalized_entropy, 1.0)
+    return min(max(normalized_entropy, 0.0), 1.0)
+
+
+def _count_tokens(text: str) -> Dict[str, int]:
+    """
+    Частоты токенов (split по пробелам, без учёта регистра).
+
+    ПОЧЕМУ два пути: Counter(text.lower().split()) работает целиком в C и
+    быстрее на обычных саммари, но держит в памяти копию текста и список всех
+    токенов. На длинных текстах пиковая память важнее — считаем за один
+    проход по finditer, переводя в нижний регистр только сам токен.
+    """
+    if len(text) < _STREAM_TOKENIZE_MIN_CHARS:
+        return Counter(text.lower().split())
+    counts: Dict[str, int] = {}
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group().lower()
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+
+def _compute_heuristics(summary: str, original_text: str) -> Dict[str, float]:
+    """Эвристические метрики саммари (без LLM)."""
+    # Рассчитываем token entropy
+    token_entropy = calculate_token_entropy(summary)
+    
+    # Эвристические метрики
+    summary_length = len(summary.split())
+    original_length = len(original_text.split())
+    compression_ratio = summary_length / original_length if original_length > 0 else 0.0
+    
+    return {
+        "token_entropy": token_entropy,
+        "compression_ratio": compression_ratio,
+        "factual_consistency": 0.8,  # Placeholder, требует LLM
+        "completeness": min(compression_ratio * 2, 1.0),  # Эвристика
+        "coherence": 0.8,  # Placeholder
+        "conciseness": 1.0 - compression_ratio if compression_ratio < 1.0 else 0.5,
+    }
+
+
+def _heuristic_result(base_metrics: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Результат calculate_confidence_score только по эвристикам.
+
+    ПОЧЕМУ отдельно: fallback-ветки LLM-пути переиспользуют уже посчитанные
+    метрики вместо рекурсивного вызова с повторной токенизацией.
+    """
+    confidence_score = (
+        base_metrics["factual_consistency"] * 0.4 +
+        base_metrics["completeness"] * 0.2 +
+        base_metrics["coherence"] * 0.2 +
+        base_metrics["conciseness"] * 0.2
+    )
+    
+    return {
+        "confidence_score": confidence_score,
+        **base_metrics,
+    }
 
 
 def calculate_confidence_score(
@@ -76,50 +145,25 @@ def calculate_confidence_score(
     """
     logger.info("calculating_confidence_score", summary_length=len(summary))
     
-    # Рассчитываем token entropy
-    token_entropy = calculate_token_entropy(summary)
-    
-    # Эвристические метрики
-    summary_length = len(summary.split())
-    original_length = len(original_text.split())
-    compression_ratio = summary_length / original_length if original_length > 0 else 0.0
-    
-    # Базовые метрики (эвристики)
-    base_metrics = {
-        "token_entropy": token_entropy,
-        "compression_ratio": compression_ratio,
-        "factual_consistency": 0.8,  # Placeholder, требует LLM
-        "completeness": min(compression_ratio * 2, 1.0),  # Эвристика
-        "coherence": 0.8,  # Placeholder
-        "conciseness": 1.0 - compression_ratio if compression_ratio < 1.0 else 0.5,
-    }
+    base_metrics = _compute_heuristics(summary, original_text)
+    token_entropy = base_metrics["token_entropy"]
     
     # Если не используем LLM, возвращаем эвристики
     if not use_llm:
-        confidence_score = (
-            base_metrics["factual_consistency"] * 0.4 +
-            base_metrics["completeness"] * 0.2 +
-            base_metrics["coherence"] * 0.2 +
-            base_metrics["conciseness"] * 0.2
-        )
-        
-        return {
-            "confidence_score": confidence_score,
-            **base_metrics,
-        }
+        return _heuristic_result(base_metrics)
     
     # Используем LLM для оценки
     client = get_llm_client(role="critic")
     if not client:
         logger.warning("llm_critic_not_available", using_heuristics=True)
-        return calculate_confidence_score(summary, original_text, use_llm=False)
+        return _heuristic_result(base_metrics)
     
     prompt = get_critic_prompt(summary, original_text)
     response = client.call(prompt, system_prompt="Ты — эксперт по оценке качества саммари.")
     
     if response.get("error"):
         logger.warning("llm_critic_failed", error=response["error"], using_heuristics=True)
-        return calculate_confidence_score(summary, original_text, use_llm=False)
+        return _heuristic_result(base_metrics)
     
     try:
         # Парсим JSON ответ
@@ -129,7 +173,14 @@ def calculate_confidence_score(
         elif "```" in result_text:
             result_text = result_text.split("```")[1].split("```")[0].strip()
         
-        llm_metrics = json.loads(result_text)
+        try:
+            llm_metrics = json_loads(result_text)
+        except json.JSONDecodeError:
+            # Критик мог окружить JSON пояснениями — берём последний объект
+            objects = [o for o in extract_json_objects(result_text) if isinstance(o, dict)]
+            if not objects:
+                raise
+            llm_metrics = objects[-1]
         
         # Объединяем метрики
         confidence_score = (
@@ -152,7 +203,7 @@ def calculate_confidence_score(
         
     except json.JSONDecodeError as e:
         logger.warning("deepconf_json_parse_failed", error=str(e), using_heuristics=True)
-        return calculate_confidence_score(summary, original_text, use_llm=False)
+        return _heuristic_result(base_metrics)
 
 
 def should_refine(confidence_score: float, threshold: float = 0.85) -> bool:
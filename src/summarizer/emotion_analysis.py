@@ -2,15 +2,78 @@
 Эмоциональный анализ речи.
 Reflexio v2.1 — Surpass Smart Noter Sprint
 """
-from typing import Any, Dict
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet
 
+from src.utils.json_utils import json_loads
 from src.utils.logging import get_logger
 
+try:
+    import ahocorasick as _ahocorasick  # type: ignore[import-not-found]
+except ImportError:
+    _ahocorasick = None
+
 logger = get_logger("summarizer.emotion")
 
+# Простые паттерны эмоций
+_EMOTION_KEYWORDS = {
+    "радость": ("рад", "счастлив", "отлично", "замечательно", "прекрасно", "ура"),
+    "грусть": ("грустно", "печаль", "плохо", "жаль", "обидно"),
+    "злость": ("злой", "разозлился", "бесит", "ненавижу", "раздражен"),
+    "страх": ("боюсь", "страшно", "опасно", "тревожно", "волнуюсь"),
+    "удивление": ("удивительно", "неожиданно", "вау", "ого"),
+    "спокойствие": ("спокойно", "расслабленно", "умиротворенно"),
+}
+_POSITIVE_WORDS = frozenset(("хорошо", "отлично", "замечательно", "прекрасно", "рад"))
+_NEGATIVE_WORDS = frozenset(("плохо", "ужасно", "грустно", "злой", "бесит"))
+_ALL_KEYWORDS = frozenset(
+    kw for kws in _EMOTION_KEYWORDS.values() for kw in kws
+) | _POSITIVE_WORDS | _NEGATIVE_WORDS
+
+
+def _build_automaton():
+    """Aho-Corasick автомат по всем ключевым словам (None без pyahocorasick)."""
+    if _ahocorasick is None:
+        return None
+    automaton = _ahocorasick.Automaton()
+    for keyword in _ALL_KEYWORDS:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+# ПОЧЕМУ автомат: ~35 отдельных проходов `keyword in text` заменяются одним
+# линейным проходом по тексту — заметно на длинных транскрипциях.
+_AUTOMATON = _build_automaton()
+
+# ПОЧЕМУ lookahead + IGNORECASE: находит все вхождения (в т.ч. перекрывающиеся)
+# за один проход без копии text.lower(); в нижний регистр переводим только
+# найденные совпадения. На одной позиции ловится одно слово — ни одно
+# ключевое слово не является префиксом другого.
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(kw) for kw in sorted(_ALL_KEYWORDS, key=len, reverse=True)) + "))",
+    re.IGNORECASE,
+)
+
+
+def _find_keywords(text: str) -> FrozenSet[str]:
+    """Ключевые слова, встречающиеся в тексте без учёта регистра (подстрокой)."""
+    if _AUTOMATON is not None:
+        # pyahocorasick чувствителен к регистру — ему нужен lower()
+        return frozenset(keyword for _, keyword in _AUTOMATON.iter(text.lower()))
+    return frozenset(match.lower() for match in _KEYWORD_RE.findall(text))
+
 
 class EmotionAnalyzer:
     """Анализатор эмоций в тексте и аудио."""
+
+    # ПОЧЕМУ порог: на коротких фразах правила по ключевым словам не хуже LLM,
+    # а вызов LLM — целый сетевой round-trip на горячем пути CoD.
+    LLM_MIN_CHARS = 200
+    # Сколько текста отправляется в LLM
+    LLM_MAX_CHARS = 1000
     
     def __init__(self, method: str = "text"):
         """
@@ -19,6 +82,7 @@ class EmotionAnalyzer:
         """
         self.method = method
         self._audio_analyzer = None
+        self._llm_client: Any = None
         
         if method == "audio":
             try:
@@ -32,6 +96,8 @@ class EmotionAnalyzer:
     def analyze_text(self, text: str) -> Dict[str, Any]:
         """
         Анализирует эмоции в тексте через LLM.
+
+        Тексты короче LLM_MIN_CHARS сразу идут в rule-based анализ.
         
         Args:
             text: Текст для анализа
@@ -39,13 +105,15 @@ class EmotionAnalyzer:
         Returns:
             Словарь с эмоциями, интенсивностью и метаданными
         """
+        if len(text) < self.LLM_MIN_CHARS:
+            return self._fallback_text_analysis(text)
+
         try:
-            from src.llm.providers import get_llm_client
-            
-            client = get_llm_client(role="actor")
+            client = self._get_llm_client()
             if not client:
                 return self._fallback_text_analysis(text)
             
+            excerpt = text if len(text) <= self.LLM_MAX_CHARS else text[:self.LLM_MAX_CHARS]
             prompt = f"""Проанализируй эмоциональное состояние в следующем тексте и верни JSON:
 {{
     "emotions": ["список", "основных", "эмоций"],
@@ -56,14 +124,13 @@ class EmotionAnalyzer:
 }}
 
 Текст:
-{text[:1000]}
+{excerpt}
 
 Верни только JSON, без дополнительного текста."""
 
             response = client.call(prompt, system_prompt="Ты эксперт по анализу эмоций в тексте.")
             
             if response.get("text"):
-                import json
                 try:
                     # Парсим JSON из ответа
                     result_text = response["text"].strip()
@@ -73,7 +140,7 @@ class EmotionAnalyzer:
                     elif "```" in result_text:
                         result_text = result_text.split("```")[1].split("```")[0].strip()
                     
-                    result = json.loads(result_text)
+                    result = json_loads(result_text)
                     result["method"] = "llm"
                     result["confidence"] = 0.85
                     return result
@@ -86,32 +153,33 @@ class EmotionAnalyzer:
             logger.error("emotion_analysis_failed", error=str(e), fallback="rule_based")
             return self._fallback_text_analysis(text)
     
+    def _get_llm_client(self):
+        """
+        LLM-клиент анализатора: переиспользуется, как только получен.
+
+        ПОЧЕМУ None не кэшируем: анализатор живёт весь процесс (_get_analyzer),
+        и сбой провайдера на старте или провайдер, настроенный позже, иначе
+        навсегда отключили бы LLM-анализ.
+        """
+        if self._llm_client is None:
+            from src.llm.providers import get_llm_client
+
+            self._llm_client = get_llm_client(role="actor")
+        return self._llm_client
+
     def _fallback_text_analysis(self, text: str) -> Dict[str, Any]:
         """Простой анализ на основе ключевых слов."""
-        text_lower = text.lower()
-        
-        # Простые паттерны эмоций
-        emotion_keywords = {
-            "радость": ["рад", "счастлив", "отлично", "замечательно", "прекрасно", "ура"],
-            "грусть": ["грустно", "печаль", "плохо", "жаль", "обидно"],
-            "злость": ["злой", "разозлился", "бесит", "ненавижу", "раздражен"],
-            "страх": ["боюсь", "страшно", "опасно", "тревожно", "волнуюсь"],
-            "удивление": ["удивительно", "неожиданно", "вау", "ого"],
-            "спокойствие": ["спокойно", "расслабленно", "умиротворенно"],
-        }
-        
-        detected_emotions = []
-        for emotion, keywords in emotion_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                detected_emotions.append(emotion)
-        
+        hits = _find_keywords(text)
+
+        detected_emotions = [
+            emotion for emotion, keywords in _EMOTION_KEYWORDS.items()
+            if not hits.isdisjoint(keywords)
+        ]
+
         # Определяем sentiment
-        positive_words = ["хорошо", "отлично", "замечательно", "прекрасно", "рад"]
-        negative_words = ["плохо", "ужасно", "грустно", "злой", "бесит"]
-        
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
-        
+        positive_count = len(hits & _POSITIVE_WORDS)
+        negative_count = len(hits & _NEGATIVE_WORDS)
+
         if positive_count > negative_count:
             sentiment = "positive"
         elif negative_count > positive_count:
@@ -175,10 +243,9 @@ def analyze_emotions(text: str, method: str = "text") -> Dict[str, Any]:
     Returns:
         Результат анализа эмоций
     """
-    analyzer = EmotionAnalyzer(method=method)
-    return analyzer.analyze_text(text)
-
-
-
+    return _get_analyzer(method).analyze_text(text)
 
 
+# ПОЧЕМУ кэш: analyze_emotions вызывается на каждый CoD/транскрипт — один
+# анализатор на метод держит LLM-клиент вместо поиска провайдера на каждый вызов.
+_get_analyzer = lru_cache(maxsize=2)(EmotionAnalyzer)
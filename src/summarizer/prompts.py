@@ -8,13 +8,15 @@ from typing import List, Dict, Any, Optional
 from src.context.optimizer import compress_for_llm
 
 
-def get_chain_of_density_prompt(text: str, iterations: int = 5) -> str:
+def get_chain_of_density_prompt(text: str, iterations: int = 5, fused: bool = False) -> str:
     """
     Chain of Density (CoD) промпт для постепенного уплотнения саммари.
 
     Args:
         text: Исходный текст для саммаризации
         iterations: Количество итераций уплотнения
+        fused: Запросить все итерации одним ответом — JSON-массивом из
+            iterations объектов (иначе — один JSON-объект на ответ)
 
     Returns:
         Промпт для LLM
@@ -24,6 +26,20 @@ def get_chain_of_density_prompt(text: str, iterations: int = 5) -> str:
     # сохраняя числа, имена, решения. Fallback на text[:4000] если CCBM недоступен.
     truncated_text = compress_for_llm(text, budget=4000)
 
+    item_format = """{
+    "summary": "текст саммари",
+    "density_score": 0.0-1.0,
+    "entities": ["список упомянутых сущностей"],
+    "key_facts": ["список ключевых фактов"]
+}"""
+    if fused:
+        answer_format = (
+            f"Формат ответа — ТОЛЬКО JSON-массив из {iterations} объектов, "
+            f"по одному на итерацию, от наименее к наиболее плотному:\n[\n{item_format},\n...\n]"
+        )
+    else:
+        answer_format = f"Формат ответа (JSON):\n{item_format}"
+
     base_prompt = f"""Ты — эксперт по созданию информационно-плотных саммари.
 
 Твоя задача: создать саммари текста на РУССКОМ языке, постепенно увеличивая информационную плотность.
@@ -41,13 +57,7 @@ def get_chain_of_density_prompt(text: str, iterations: int = 5) -> str:
    - Причинно-следственные связи
 3. Сохраняй краткость, но увеличивай информационную плотность
 
-Формат ответа (JSON):
-{{
-    "summary": "текст саммари",
-    "density_score": 0.0-1.0,
-    "entities": ["список упомянутых сущностей"],
-    "key_facts": ["список ключевых фактов"]
-}}
+{answer_format}
 
 Создай {iterations} итераций, каждая более плотная, чем предыдущая.
 """
@@ -52,6 +52,7 @@ class Settings(BaseSettings):
     MEMORY_ENABLED: bool = True
     RETRIEVAL_ENABLED: bool = True
     INTEGRITY_CHAIN_ENABLED: bool = True
+    INTEGRITY_HASH_ALGO: str = "sha256"  # sha256 | blake3 (требует пакет blake3)
 
     # MCP Intelligence
     BRAVE_API_KEY: str | None = None
@@ -65,6 +66,8 @@ class Settings(BaseSettings):
     SUPABASE_URL: str | None = None
     SUPABASE_ANON_KEY: str | None = None
     SUPABASE_SERVICE_KEY: str | None = None
+    # Прямое подключение к Postgres (COPY при миграции больших таблиц)
+    SUPABASE_DB_URL: str | None = None
 
     # LLM Providers
     LLM_PROVIDER: str = "openai"
@@ -137,6 +140,9 @@ class Settings(BaseSettings):
 
     # Embeddings
     ENABLE_LOCAL_EMBEDDINGS: bool = False
+    # Backend локальной модели: "torch" или "onnx" (ONNX Runtime, ~2-4x быстрее на CPU,
+    # требует onnxruntime)
+    LOCAL_EMBEDDINGS_BACKEND: str = "torch"
     EMBEDDING_DIM: int = 1536  # 1536 для OpenAI text-embedding-3-small, 384 для MiniLM
 
     # Ingest
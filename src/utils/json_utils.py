@@ -0,0 +1,82 @@
+"""
+Разбор JSON: быстрый json_loads и извлечение JSON-объектов из ответов LLM.
+
+Использование:
+  from src.utils.json_utils import json_loads, extract_json_objects
+
+  json_loads('{"a": 1}')                          # {"a": 1}
+  extract_json_objects('Итог: {"summary": "…"}')  # [{"summary": "…"}]
+"""
+import json
+from typing import Any, List, Optional
+
+# ПОЧЕМУ graceful import: orjson — C-парсер, в 3-5 раз быстрее json.loads
+# (embedding-массивы в search_phrases, ответы LLM в summarizer). Без orjson —
+# stdlib json, поведение идентичное.
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None  # type: ignore[assignment]
+
+
+def json_loads(raw: str | bytes) -> Any:
+    """json.loads через orjson, если доступен (orjson.JSONDecodeError — подкласс json.JSONDecodeError)."""
+    if _orjson is not None:
+        return _orjson.loads(raw)
+    return json.loads(raw)
+
+
+def extract_json_objects(text: str) -> List[Any]:
+    """
+    Находит все JSON-объекты верхнего уровня в произвольном тексте.
+
+    От каждой «{» ищем парную «}» счётчиком глубины; строки внутри объекта
+    учитываются (скобки в кавычках и экранирование не сбивают счёт).
+    Сбалансированный {...} пробуем распарсить и продолжаем за ним. Если
+    скобка не закрыта или фрагмент невалиден — сканируем заново со следующего
+    символа: случайная «{» в прозе не должна прятать объект после неё, а
+    невалидная внешняя обёртка — вложенные объекты.
+
+    ПОЧЕМУ не regex: прежний шаблон понимал только один уровень вложенности
+    и на длинных ответах уходил в квадратичный backtracking.
+    """
+    objects: List[Any] = []
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start < 0:
+            return objects
+        end = _matching_brace(text, start)
+        if end is not None:
+            try:
+                objects.append(json_loads(text[start:end + 1]))
+                pos = end + 1
+                continue
+            except json.JSONDecodeError:
+                pass
+        pos = start + 1
+
+
+def _matching_brace(text: str, start: int) -> Optional[int]:
+    """Индекс «}», закрывающей «{» в позиции start, или None, если её нет."""
+    depth = 0
+    in_string = False
+    escape = False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return pos
+    return None
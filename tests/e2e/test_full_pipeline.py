@@ -16,7 +16,11 @@ from unittest.mock import patch
 import pytest
 
 from src.storage.db import get_reflexio_db, ensure_all_tables
-from src.storage.ingest_persist import persist_structured_event
+from src.storage.ingest_persist import (
+    persist_structured_event,
+    persist_structured_events_bulk,
+    persist_ws_transcriptions_bulk,
+)
 from src.enrichment.schema import StructuredEvent
 from src.utils.config import settings
 
@@ -208,6 +212,60 @@ def test_reprocess_creates_new_version(pipeline_db):
     assert v2["supersedes_id"] == v1["id"]
 
 
+def test_bulk_persist_keeps_version_chain(pipeline_db):
+    """Пачка из нескольких версий одного transcription_id — одна транзакция.
+
+    ПОЧЕМУ: версии внутри батча не видны SELECT'у до вставки — цепочка
+    version/supersedes_id должна строиться так же, как при поштучной записи.
+    """
+    _, db_path = pipeline_db
+    trans_id = str(uuid.uuid4())
+    events = [
+        StructuredEvent(
+            id=str(uuid.uuid4()),
+            transcription_id=trans_id,
+            timestamp=datetime.now(timezone.utc),
+            text=f"Версия {n}",
+            topics=["бюджет"],
+        )
+        for n in range(3)
+    ]
+    persist_structured_event(db_path, events[0])
+
+    ids = persist_structured_events_bulk(db_path, events[1:])
+    assert ids == [events[1].id, events[2].id]
+
+    db = get_reflexio_db(db_path)
+    rows = db.fetchall(
+        "SELECT id, version, is_current, supersedes_id FROM structured_events "
+        "WHERE transcription_id = ? ORDER BY version",
+        (trans_id,),
+    )
+    assert [r["version"] for r in rows] == [1, 2, 3]
+    assert [r["is_current"] for r in rows] == [0, 0, 1]
+    assert rows[1]["supersedes_id"] == rows[0]["id"]
+    assert rows[2]["supersedes_id"] == rows[1]["id"]
+
+
+def test_ws_transcriptions_bulk_persist(pipeline_db):
+    """Пачка WS-транскрипций пишется одной транзакцией, повтор — dedupe."""
+    _, db_path = pipeline_db
+    items = [
+        (f"ws-{n}", f"{n}.wav", f"/tmp/{n}.wav", 100, {"text": f"текст {n}"})
+        for n in range(3)
+    ]
+    items.append(("ws-bad", "bad.wav", "/tmp/bad.wav", 0, None))
+
+    ids = persist_ws_transcriptions_bulk(db_path, items)
+    assert ids[3] is None
+    assert all(ids[:3])
+
+    again = persist_ws_transcriptions_bulk(db_path, items[:3])
+    assert again == ids[:3]
+    db = get_reflexio_db(db_path)
+    assert db.fetchone("SELECT COUNT(*) FROM transcriptions")[0] == 3
+
+
 def test_migration_tracking(pipeline_db):
     """run_migrations() применяет новые и пропускает уже применённые.
 
@@ -1141,7 +1141,7 @@ def test_summarizer_critic_refine_branch():
             {"confidence_score": 0.5, "token_entropy": 0.3, "metrics": {}},
             {"confidence_score": 0.9, "token_entropy": 0.4, "metrics": {}},
         ]
-        result = validate_summary("Bad summary.", "Original.", confidence_threshold=0.85)
+        result = validate_summary("Bad summary.", "Original.", confidence_threshold=0.85, fast_gate=False)
     assert result["refined"] is True
     assert result["summary"] == "Refined summary."
     assert result["confidence_score"] == 0.9
@@ -1867,6 +1867,66 @@ def test_storage_db_sqlite_backend_crud(tmp_path):
     assert len(backend.select("metrics")) == 0
 
 
+def test_storage_db_sqlite_backend_iter_select_chunks(tmp_path):
+    """SQLiteBackend.iter_select отдаёт все строки пачками fetchmany и парсит JSON."""
+    from src.storage.db import SQLiteBackend
+
+    db_path = tmp_path / "reflexio.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE metrics (id TEXT PRIMARY KEY, name TEXT, segments TEXT)")
+    conn.executemany(
+        "INSERT INTO metrics (id, name, segments) VALUES (?, ?, ?)",
+        [(f"m{i}", f"n{i}", '["x"]') for i in range(7)],
+    )
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(db_path)
+    it = backend.iter_select("metrics", chunk_size=3)
+    first = next(it)
+    assert first["segments"] == ["x"]
+    rest = list(it)
+    assert len(rest) == 6
+    assert {r["id"] for r in rest} | {first["id"]} == {f"m{i}" for i in range(7)}
+
+    with pytest.raises(ValueError):
+        backend.select("not_allowed_table")
+
+
+def test_storage_db_sqlite_backend_insert_many(tmp_path):
+    """SQLiteBackend.insert_many пишет пачку одним executemany, JSON-поля сериализуются."""
+    from src.storage.db import SQLiteBackend
+
+    db_path = tmp_path / "reflexio.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE metrics (id TEXT PRIMARY KEY, name TEXT, segments TEXT)")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(db_path)
+    n = backend.insert_many(
+        "metrics",
+        [{"id": f"m{i}", "name": "n", "segments": [i]} for i in range(3)],
+    )
+    assert n == 3
+    rows = backend.select("metrics")
+    assert sorted(r["segments"][0] for r in rows) == [0, 1, 2]
+
+    assert backend.insert_many("metrics", []) == 0
+    with pytest.raises(ValueError):
+        backend.insert_many("metrics", [{"id": "a", "name": "x"}, {"id": "b"}])
+    assert len(backend.select("metrics")) == 3
+
+    # Неудачная пачка откатывается целиком: дубль PK посередине executemany
+    with pytest.raises(sqlite3.IntegrityError):
+        backend.insert_many(
+            "metrics",
+            [{"id": "new1", "name": "n"}, {"id": "m1", "name": "dup"}, {"id": "new2", "name": "n"}],
+        )
+    assert sorted(r["id"] for r in backend.select("metrics")) == ["m0", "m1", "m2"]
+    assert not backend.conn.in_transaction
+
+
 def test_storage_db_get_db_backend_sqlite(tmp_path):
     """get_db_backend returns SQLiteBackend when DB_BACKEND=sqlite."""
     from src.storage.db import get_db_backend
@@ -1930,6 +1990,42 @@ def test_storage_embeddings_generate_mock_openai():
     assert result == fake_embedding
 
 
+def test_storage_embeddings_openai_client_reused():
+    """OpenAI client создаётся один раз на ключ и переиспользуется между вызовами."""
+    from src.storage import embeddings as emb_mod
+
+    mock_response = MagicMock()
+    mock_response.data = [MagicMock(embedding=[0.1] * 8)]
+
+    with patch.object(emb_mod, "_openai_client", None), patch.object(emb_mod, "_openai_client_key", None):
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-reuse"}, clear=False):
+            with patch("openai.OpenAI") as mock_openai_cls:
+                mock_openai_cls.return_value.embeddings.create.return_value = mock_response
+                emb_mod.generate_embeddings("a", use_cache=False)
+                emb_mod.generate_embeddings("b", use_cache=False)
+    assert mock_openai_cls.call_count == 1
+
+
+def test_storage_embeddings_local_model_onnx_falls_back_to_torch():
+    """Если ONNX backend недоступен — локальная модель грузится через torch."""
+    import sys
+    from src.storage import embeddings as emb_mod
+
+    st_mod = MagicMock()
+    torch_model = MagicMock()
+
+    def _ctor(name, backend=None):
+        if backend == "onnx":
+            raise ImportError("onnxruntime missing")
+        return torch_model
+
+    st_mod.SentenceTransformer.side_effect = _ctor
+    with patch.dict(sys.modules, {"sentence_transformers": st_mod}):
+        with patch.dict(os.environ, {"LOCAL_EMBEDDINGS_BACKEND": "onnx"}, clear=False):
+            assert emb_mod._load_st_model() is torch_model
+    assert st_mod.SentenceTransformer.call_count == 2
+
+
 def test_storage_embeddings_search_phrases_mock_db():
     """search_phrases with mocked db and generate_embeddings."""
     from src.storage.embeddings import search_phrases
@@ -1960,7 +2056,7 @@ def test_storage_embeddings_store_embeddings_mock_db():
             db_backend=mock_db,
         )
     assert ok is True
-    assert mock_db.insert.called
+    assert mock_db.insert_many.called
 
 
 def test_monitor_health_check_db_fail():
@@ -2012,7 +2108,10 @@ def test_storage_embeddings_store_embeddings_skips_empty_text():
             db_backend=mock_db,
         )
     assert ok is True
-    assert mock_db.insert.call_count == 1
+    mock_db.insert_many.assert_called_once()
+    table, rows = mock_db.insert_many.call_args[0]
+    assert table == "text_entries"
+    assert len(rows) == 1
 
 
 def test_storage_retention_policy_cleanup_audio_zero():
@@ -2237,7 +2336,7 @@ def test_summarizer_emotion_analyze_text_mock_llm():
         "error": None,
     }
     with patch("src.llm.providers.get_llm_client", return_value=mock_client):
-        result = analyzer.analyze_text("Hello world.")
+        result = analyzer.analyze_text("Hello world. " * 20)
     assert "emotions" in result or "primary_emotion" in result
     assert result.get("method") == "llm" or "primary_emotion" in result
 
@@ -3602,7 +3701,7 @@ def test_summarizer_emotion_analyzer_llm_json_fallback():
     mock_client.call.return_value = {"text": "not valid json"}
     with patch("src.llm.providers.get_llm_client", return_value=mock_client):
         a = EmotionAnalyzer(method="text")
-        out = a.analyze_text("Test")
+        out = a.analyze_text("Test " * 50)
     assert isinstance(out, dict)
 
 
@@ -3753,3 +3852,1253 @@ def test_digest_generator_output_format_pdf_import_error(tmp_path):
                     out = gen.generate(date(2026, 1, 1), output_format="pdf")
     assert out is not None
     assert out.exists()
+
+
+def test_storage_ingest_persist_schema_ensured_once(tmp_path):
+    """_migrate: шаги схемы выполняются один раз на файл БД."""
+    from src.storage import ingest_persist
+    from src.storage.db import get_reflexio_db
+
+    db = get_reflexio_db(tmp_path / "r.db")
+    step = MagicMock(wraps=ingest_persist._ensure_sqlite_ingest_tables)
+    with patch.object(ingest_persist, "_MIGRATIONS", [step, *ingest_persist._MIGRATIONS[1:]]):
+        ingest_persist._migrate(db)
+        ingest_persist._migrate(db)
+        ingest_persist.ensure_ingest_tables(tmp_path / "r.db")
+    assert step.call_count == 1
+    assert db.fetchone("SELECT name FROM sqlite_master WHERE name = 'user_profile'")
+
+
+def test_storage_health_metrics_migrate_once(tmp_path):
+    """ensure_health_tables: DDL применяется один раз на соединение, без явной транзакции."""
+    from src.storage import health_metrics
+    from src.storage.db import get_reflexio_db
+
+    db_path = tmp_path / "h.db"
+    with patch.object(
+        health_metrics, "_apply_migrations", wraps=health_metrics._apply_migrations
+    ) as apply:
+        health_metrics.ensure_health_tables(db_path)
+        health_metrics.ensure_health_tables(db_path)
+    assert apply.call_count == 1
+    assert not get_reflexio_db(db_path).conn.in_transaction
+    assert get_reflexio_db(db_path).fetchone(
+        "SELECT name FROM sqlite_master WHERE name = 'idx_health_metrics_day'"
+    )
+
+
+def test_storage_db_ensure_schema_reapplied_after_file_replaced(tmp_path):
+    """Схема кэшируется на соединение: БД, пересозданная по тому же пути, снова получает таблицы."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.health_metrics import ensure_health_tables
+    from src.storage.ingest_persist import ensure_ingest_tables
+    from src.storage.integrity import ensure_integrity_tables
+
+    db_path = tmp_path / "sub" / "r.db"
+    db = get_reflexio_db(db_path)
+    for _ in range(2):
+        ensure_ingest_tables(db_path)
+        ensure_integrity_tables(db_path)
+        ensure_health_tables(db_path)
+        names = {r[0] for r in db.fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"transcriptions", "integrity_events", "health_metrics"} <= names
+        db.close_conn()
+        for leftover in db_path.parent.iterdir():
+            leftover.unlink()
+        db_path.parent.rmdir()
+
+
+def test_storage_ingest_persist_write_digest_cache_upserts(tmp_path):
+    """write_digest_cache: повторная запись за день обновляет строку на месте."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.ingest_persist import write_digest_cache
+
+    db_path = tmp_path / "r.db"
+    write_digest_cache(db_path, day_key="2026-01-15", digest_json="{}")
+    write_digest_cache(
+        db_path, day_key="2026-01-15", digest_json='{"v": 2}', rebuild_reason="manual"
+    )
+    rows = get_reflexio_db(db_path).fetchall("SELECT digest_json, rebuild_reason FROM digest_cache")
+    assert [(r["digest_json"], r["rebuild_reason"]) for r in rows] == [('{"v": 2}', "manual")]
+
+
+def test_storage_db_transaction_immediate_takes_write_lock(tmp_path):
+    """ReflexioDB.transaction(immediate=True): второй писатель не может начать BEGIN IMMEDIATE."""
+    from src.storage.db import get_connection, get_reflexio_db
+
+    db_path = tmp_path / "r.db"
+    db = get_reflexio_db(db_path)
+    db.execute("CREATE TABLE t (x INTEGER)")
+    other = get_connection(db_path)
+    other.execute("PRAGMA busy_timeout = 0")
+    with db.transaction(immediate=True):
+        with pytest.raises(sqlite3.OperationalError):
+            other.execute("BEGIN IMMEDIATE")
+        db.execute("INSERT INTO t VALUES (1)")
+    assert other.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    other.close()
+
+
+def test_storage_ingest_persist_dumps_matches_stdlib():
+    """_dumps: stdlib-fallback пишет тот же текст, что и orjson (компактный UTF-8)."""
+    from src.storage import ingest_persist
+
+    payload = {"topics": ["бюджет"], 1: [{"text": "задача", "done": False, "score": 0.5}]}
+    with patch.object(ingest_persist, "_orjson", None):
+        slow = ingest_persist._dumps(payload)
+    assert slow == '{"topics":["бюджет"],"1":[{"text":"задача","done":false,"score":0.5}]}'
+    if ingest_persist._orjson is not None:
+        assert ingest_persist._dumps(payload) == slow
+
+
+def test_storage_ingest_persist_model_dumps_mixed_list():
+    """_model_dumps: однородный список моделей и смешанный список с fallback."""
+    from src.enrichment.schema import TaskExtracted
+    from src.storage.ingest_persist import _model_dumps
+
+    task = TaskExtracted(text="позвонить")
+    assert _model_dumps([task, task], str) == [task.model_dump(), task.model_dump()]
+    assert _model_dumps([task, "сырой"], lambda t: {"text": t}) == [
+        task.model_dump(),
+        {"text": "сырой"},
+    ]
+    assert _model_dumps([], str) == []
+
+
+def test_storage_ingest_persist_enrichment_lookup_uses_indexes(tmp_path):
+    """get_enrichment_by_ingest_id: план запроса идёт по индексам, без full scan."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.ingest_persist import ensure_ingest_tables
+
+    db_path = tmp_path / "r.db"
+    ensure_ingest_tables(db_path)
+    plan = get_reflexio_db(db_path).fetchall(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT se.summary FROM structured_events se
+        JOIN transcriptions t ON se.transcription_id = t.id
+        WHERE t.ingest_id = ? AND se.is_current = 1
+        ORDER BY se.created_at DESC LIMIT 1
+        """,
+        ("f1",),
+    )
+    details = " ".join(row["detail"] for row in plan)
+    assert "idx_transcriptions_ingest" in details
+    assert "SCAN se" not in details
+
+
+def test_storage_ingest_persist_transcriptions_exist_chunks(tmp_path):
+    """transcriptions_exist: один IN-запрос на чанк, возвращает найденные id."""
+    from src.storage import ingest_persist
+
+    db_path = tmp_path / "r.db"
+    items = [(f"f{n}", f"{n}.wav", f"/tmp/{n}.wav", 1, {"text": "x"}) for n in range(3)]
+    ids = ingest_persist.persist_ws_transcriptions_bulk(db_path, items)
+    with patch.object(ingest_persist, "_EXISTS_CHUNK_SIZE", 2):
+        found = ingest_persist.transcriptions_exist(db_path, ids + ["missing", ids[0]])
+    assert found == set(ids)
+    assert ingest_persist.transcription_exists(db_path, ids[1])
+    assert not ingest_persist.transcription_exists(db_path, "missing")
+    assert ingest_persist.transcriptions_exist(tmp_path / "none.db", ids) == set()
+
+
+def test_storage_health_metrics_list_returns_dicts(tmp_path):
+    """list_health_metrics: строки собираются по _HEALTH_KEYS во всех ветках фильтра."""
+    from src.storage.health_metrics import _HEALTH_KEYS, list_health_metrics, save_health_metrics
+
+    db_path = tmp_path / "r.db"
+    save_health_metrics(db_path, "2026-01-14", 1000, 60, 7.5, 0.2)
+    save_health_metrics(db_path, "2026-01-15", 2000, 70, 6.0, 0.4, source="watch")
+
+    recent = list_health_metrics(db_path)
+    assert [r["day"] for r in recent] == ["2026-01-15", "2026-01-14"]
+    assert tuple(recent[0]) == _HEALTH_KEYS
+    assert recent[0]["source"] == "watch"
+    assert len(list_health_metrics(db_path, day_from="2026-01-14")) == 1
+    assert len(list_health_metrics(db_path, "2026-01-14", "2026-01-15")) == 2
+
+
+def test_storage_ingest_persist_ws_segments_variants(tmp_path):
+    """persist_ws_transcription: segments как list/str/bytes/несериализуемый объект."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.ingest_persist import persist_ws_transcription
+
+    db_path = tmp_path / "r.db"
+    variants = {
+        "list": [{"start": 0.0, "text": "a"}],
+        "str": '[{"start": 0.0}]',
+        "bytes": b'[{"start": 1.0}]',
+        "bad": object(),
+    }
+    stored = {}
+    for name, segments in variants.items():
+        tid = persist_ws_transcription(
+            db_path, f"f-{name}", "a.wav", "/tmp/a.wav", 1, {"text": "x", "segments": segments}
+        )
+        row = get_reflexio_db(db_path).fetchone(
+            "SELECT segments FROM transcriptions WHERE id = ?", (tid,)
+        )
+        stored[name] = row["segments"]
+    assert json.loads(stored["list"]) == variants["list"]
+    assert stored["str"] == variants["str"]
+    assert stored["bytes"] == '[{"start": 1.0}]'
+    assert stored["bad"] is None
+
+
+def test_storage_integrity_hash_text_and_bytes_match(tmp_path):
+    """append_integrity_event: payload_text кодируется на границе, хэш = sha256(utf-8)."""
+    import hashlib
+
+    from src.storage.integrity import append_integrity_event, get_ingest_integrity_report
+
+    db_path = tmp_path / "r.db"
+    append_integrity_event(db_path, "i1", "received", payload_bytes="привет".encode())
+    append_integrity_event(db_path, "i1", "transcribed", payload_text="привет")
+    append_integrity_event(db_path, "i1", "empty")
+    report = get_ingest_integrity_report(db_path, "i1")
+    hashes = [e["content_hash"] for e in report["events"]]
+    expected = hashlib.sha256("привет".encode()).hexdigest()
+    assert hashes == [expected, expected, hashlib.sha256(b"").hexdigest()]
+    assert report["chain_valid"] is True
+
+
+def test_storage_integrity_batch_append_links_chain(tmp_path):
+    """append_integrity_events_batch: цепочка продолжается от хвоста в БД и внутри пачки."""
+    from src.storage.integrity import (
+        append_integrity_event,
+        append_integrity_events_batch,
+        get_ingest_integrity_report,
+    )
+
+    db_path = tmp_path / "r.db"
+    append_integrity_event(db_path, "a", "received", payload_bytes=b"0")
+    ids = append_integrity_events_batch(
+        db_path,
+        [
+            {"ingest_id": "a", "stage": "asr", "payload_text": "текст"},
+            {"ingest_id": "b", "stage": "received", "payload_bytes": b"x"},
+            {"ingest_id": "a", "stage": "enriched", "metadata": {"k": 1}},
+        ],
+    )
+    assert len(ids) == 3
+    report_a = get_ingest_integrity_report(db_path, "a")
+    assert [e["stage"] for e in report_a["events"]] == ["received", "asr", "enriched"]
+    assert report_a["chain_valid"] is True
+    assert report_a["events"][2]["metadata"] == {"k": 1}
+    assert get_ingest_integrity_report(db_path, "b")["chain_valid"] is True
+    assert append_integrity_events_batch(db_path, []) == []
+
+
+def test_storage_integrity_tables_created_once(tmp_path):
+    """ensure_integrity_tables: DDL один раз на путь, повторные append без DDL."""
+    from src.storage import integrity
+
+    db_path = tmp_path / "r.db"
+    with patch.object(
+        integrity, "_create_integrity_tables", wraps=integrity._create_integrity_tables
+    ) as create:
+        integrity.append_integrity_event(db_path, "i", "a", payload_bytes=b"1")
+        integrity.append_integrity_event(db_path, "i", "b", payload_bytes=b"2")
+        integrity.ensure_integrity_tables(db_path)
+    assert create.call_count == 1
+
+
+def test_storage_integrity_tail_lookup_is_sort_free(tmp_path):
+    """Хвост цепочки ищется по idx_integrity_ingest_created без временной сортировки."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.integrity import ensure_integrity_tables
+
+    db_path = tmp_path / "r.db"
+    ensure_integrity_tables(db_path)
+    plan = get_reflexio_db(db_path).fetchall(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT content_hash FROM integrity_events
+        WHERE ingest_id = ? ORDER BY created_at DESC, ROWID DESC LIMIT 1
+        """,
+        ("i",),
+    )
+    details = " ".join(row["detail"] for row in plan)
+    assert "idx_integrity_ingest_created" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_storage_integrity_stream_hash_matches_bytes(tmp_path):
+    """payload_path и итератор чанков дают тот же sha256, что и bytes целиком."""
+    import hashlib
+
+    from src.storage import integrity
+
+    data = os.urandom(200_000)
+    artifact = tmp_path / "a.wav"
+    artifact.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    assert integrity._compute_hash_stream(artifact).hex() == expected
+    assert integrity._compute_hash_stream(iter([data[:1000], data[1000:]])).hex() == expected
+
+    db_path = tmp_path / "r.db"
+    integrity.append_integrity_event(db_path, "i", "received", payload_path=artifact)
+    report = integrity.get_ingest_integrity_report(db_path, "i")
+    assert report["events"][0]["content_hash"] == expected
+
+
+def test_storage_integrity_hash_algo_selection(tmp_path):
+    """INTEGRITY_HASH_ALGO=blake3: без пакета — sha256; с пакетом — hash_algo в metadata."""
+    import hashlib
+
+    from src.storage import integrity
+    from src.utils.config import settings
+
+    fake_hasher = MagicMock()
+    fake_hasher.digest.return_value = b"\xb3"
+    fake_blake3 = MagicMock()
+    fake_blake3.blake3.return_value = fake_hasher
+
+    db_path = tmp_path / "r.db"
+    with patch.object(settings, "INTEGRITY_HASH_ALGO", "blake3"):
+        with patch.object(integrity, "_blake3", None):
+            integrity.append_integrity_event(db_path, "i", "a", payload_bytes=b"x")
+        with patch.object(integrity, "_blake3", fake_blake3):
+            integrity.append_integrity_event(db_path, "i", "b", payload_bytes=b"x")
+
+    events = integrity.get_ingest_integrity_report(db_path, "i")["events"]
+    assert events[0]["content_hash"] == hashlib.sha256(b"x").hexdigest()
+    assert "hash_algo" not in events[0]["metadata"]
+    assert events[1]["content_hash"] == "b3"
+    assert events[1]["metadata"]["hash_algo"] == "blake3"
+
+
+def test_storage_integrity_report_detects_broken_chain(tmp_path):
+    """get_ingest_integrity_report: подмена prev_hash или непустой head → chain_valid=False."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.integrity import append_integrity_event, get_ingest_integrity_report
+
+    db_path = tmp_path / "r.db"
+    assert get_ingest_integrity_report(db_path, "none")["chain_valid"] is True
+    for stage in ("a", "b", "c"):
+        append_integrity_event(db_path, "i", stage, payload_text=stage)
+    assert get_ingest_integrity_report(db_path, "i")["chain_valid"] is True
+
+    db = get_reflexio_db(db_path)
+    db.execute("UPDATE integrity_events SET prev_hash = 'x' WHERE stage = 'c'")
+    assert get_ingest_integrity_report(db_path, "i")["chain_valid"] is False
+    db.execute(
+        "UPDATE integrity_events SET prev_hash = (SELECT content_hash FROM integrity_events WHERE stage = 'b') WHERE stage = 'c'"
+    )
+    db.execute("UPDATE integrity_events SET prev_hash = 'x' WHERE stage = 'a'")
+    assert get_ingest_integrity_report(db_path, "i")["chain_valid"] is False
+
+
+def test_storage_integrity_append_events_for_one_ingest(tmp_path):
+    """append_integrity_events: стадии одного ingest в одной транзакции, цепочка валидна."""
+    from src.storage.integrity import append_integrity_events, get_ingest_integrity_report
+
+    db_path = tmp_path / "r.db"
+    ids = append_integrity_events(
+        db_path,
+        "i",
+        [
+            {"stage": "uploaded", "payload_bytes": b"wav"},
+            {"stage": "transcribed", "payload_text": "текст"},
+            {"stage": "enriched", "metadata": {"model": "m"}},
+        ],
+    )
+    report = get_ingest_integrity_report(db_path, "i")
+    assert [e["id"] for e in report["events"]] == ids
+    assert report["chain_valid"] is True
+
+
+def test_storage_migrate_sqlite_table_counts_single_union(tmp_path):
+    """_sqlite_table_counts: счётчики существующих таблиц, отсутствующие — пропущены."""
+    from src.storage.migrate import _sqlite_table_counts
+
+    conn = sqlite3.connect(str(tmp_path / "r.db"))
+    conn.execute("CREATE TABLE facts (id TEXT)")
+    conn.execute("CREATE TABLE digests (id TEXT)")
+    conn.executemany("INSERT INTO facts (id) VALUES (?)", [("a",), ("b",)])
+    cursor = conn.cursor()
+    assert _sqlite_table_counts(cursor, ["facts", "digests", "missions"]) == {
+        "facts": 2,
+        "digests": 0,
+    }
+    assert _sqlite_table_counts(cursor, ["missions"]) == {}
+    conn.close()
+
+
+def test_storage_migrate_fetch_table_json_unwraps_json_columns(tmp_path):
+    """_fetch_table_json: строки как dict, JSON-колонки развёрнуты, невалидный JSON — строкой."""
+    from src.storage.migrate import _fetch_table_json
+
+    conn = sqlite3.connect(str(tmp_path / "r.db"))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, text TEXT, segments TEXT, n INTEGER)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?, ?, ?)",
+        [
+            ("1", '["not", "unwrapped"]', '[{"start": 0.5}]', 3),
+            ("2", "t", "broken{", None),
+            ("3", None, None, 0),
+        ],
+    )
+    cursor = conn.cursor()
+    assert _fetch_table_json(cursor, "transcriptions") == [
+        {"id": "1", "text": '["not", "unwrapped"]', "segments": [{"start": 0.5}], "n": 3},
+        {"id": "2", "text": "t", "segments": "broken{", "n": None},
+        {"id": "3", "text": None, "segments": None, "n": 0},
+    ]
+    conn.execute("CREATE TABLE facts (id TEXT)")
+    assert _fetch_table_json(cursor, "facts") == []
+    assert _fetch_table_json(cursor, "missing") == []
+    conn.close()
+
+
+def test_storage_migrate_bulk_copy_csv_chunks():
+    """_bulk_copy: CSV блоками по _COPY_CHUNK_ROWS, NULL без кавычек, JSON для dict/list."""
+    import src.storage.migrate as migrate_mod
+
+    pg_conn = MagicMock()
+    pg_cursor = pg_conn.cursor.return_value.__enter__.return_value
+    sent = []
+    pg_cursor.copy_expert.side_effect = lambda sql, buf: sent.append((sql, buf.read()))
+    rows = [
+        {"id": "1", "segments": [{"start": 0.5}], "n": 3},
+        {"id": "", "segments": None, "n": None},
+        {"id": "3", "segments": {"k": "в"}, "n": 1.5},
+    ]
+    with patch.object(migrate_mod, "_COPY_CHUNK_ROWS", 2):
+        assert migrate_mod._bulk_copy(pg_conn, "transcriptions", ["id", "segments", "n"], rows) == 3
+    assert [sql for sql, _ in sent] == [
+        'COPY "transcriptions" ("id", "segments", "n") FROM STDIN WITH (FORMAT csv)'
+    ] * 2
+    assert sent[0][1] == '"1","[{""start"": 0.5}]",3\n"",,\n'
+    assert sent[1][1] == '"3","{""k"": ""в""}",1.5\n'
+    pg_conn.commit.assert_called_once()
+
+    pg_cursor.copy_expert.side_effect = RuntimeError("copy failed")
+    with pytest.raises(RuntimeError):
+        migrate_mod._bulk_copy(pg_conn, "t", ["id"], [{"id": "1"}])
+    pg_conn.rollback.assert_called_once()
+
+
+def test_storage_migrate_to_supabase_large_table_uses_copy(tmp_path):
+    """migrate_to_supabase: таблица >= _REST_MAX_ROWS идёт через COPY, мелкая — через REST."""
+    import src.storage.migrate as migrate_mod
+
+    db_path = tmp_path / "reflexio.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, segments TEXT)")
+    conn.execute("CREATE TABLE facts (id TEXT)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)", [(str(i), "[]") for i in range(3)]
+    )
+    conn.execute("INSERT INTO facts VALUES ('f')")
+    conn.commit()
+    conn.close()
+
+    supabase = MagicMock()
+    supabase.table.return_value.insert.return_value.execute.return_value.data = [{"id": "f"}]
+    pg_conn = MagicMock()
+    with patch("src.storage.supabase_client.test_connection", return_value={"status": "ok"}), \
+         patch("src.storage.supabase_client.get_supabase_client", return_value=supabase), \
+         patch("src.utils.config.settings") as mock_settings, \
+         patch.object(migrate_mod, "_REST_MAX_ROWS", 2), \
+         patch.object(migrate_mod, "_pg_connect", return_value=pg_conn) as mock_connect, \
+         patch.object(migrate_mod, "_bulk_copy", return_value=3) as mock_copy:
+        mock_settings.STORAGE_PATH = tmp_path
+        result = migrate_mod.migrate_to_supabase(dry_run=False)
+
+    assert result["tables"]["transcriptions"]["supabase_count"] == 3
+    assert result["tables"]["facts"]["supabase_count"] == 1
+    mock_connect.assert_called_once()
+    args = mock_copy.call_args.args
+    assert args[:3] == (pg_conn, "transcriptions", ["id", "segments"])
+    assert args[3][0] == {"id": "0", "segments": []}
+    supabase.table.assert_any_call("facts")
+    pg_conn.close.assert_called_once()
+
+
+def test_storage_migrate_pg_connect_requires_url():
+    """_pg_connect: без SUPABASE_DB_URL (или psycopg2) — None, REST-путь."""
+    import src.storage.migrate as migrate_mod
+
+    with patch("src.utils.config.settings") as mock_settings:
+        mock_settings.SUPABASE_DB_URL = None
+        assert migrate_mod._pg_connect() is None
+
+
+def test_storage_retention_cleanup_transcriptions_batched(tmp_path):
+    """cleanup_transcriptions: удаляет только старые строки, пачками по DELETE_BATCH_SIZE."""
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)",
+        [(f"old{i}", "2020-01-01T00:00:00") for i in range(7)]
+        + [("new", "2999-01-01T00:00:00")],
+    )
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(db_path)
+    with patch("src.storage.db.get_db", return_value=backend):
+        policy = RetentionPolicy(transcription_retention_days=90)
+        policy.DELETE_BATCH_SIZE = 3
+        assert policy.cleanup_transcriptions() == 7
+    assert [r[0] for r in backend.conn.execute("SELECT id FROM transcriptions")] == ["new"]
+
+
+def test_persongraph_compliance_status_counters(tmp_path):
+    """get_compliance_status: счётчики по пустым и заполненным таблицам."""
+    from src.persongraph.compliance import BiometricComplianceManager
+
+    db_path = tmp_path / "r.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE persons (name TEXT)")
+    conn.execute("CREATE TABLE person_voice_samples (person_name TEXT, status TEXT)")
+    conn.execute("CREATE TABLE person_voice_profiles (person_name TEXT, expires_at TEXT)")
+    conn.commit()
+    mgr = BiometricComplianceManager(db_path)
+    status = mgr.get_compliance_status()
+    assert status["unidentified_samples"] == 0
+    assert status["active_voice_profiles"] == 0
+
+    conn.executemany("INSERT INTO persons VALUES (?)", [("a",), ("b",)])
+    conn.executemany(
+        "INSERT INTO person_voice_samples VALUES (?, ?)",
+        [(None, "accumulating"), (None, "pending_approval"), ("a", "pending_approval"), ("a", "approved")],
+    )
+    conn.executemany(
+        "INSERT INTO person_voice_profiles VALUES (?, ?)",
+        [("a", "2999-01-01T00:00:00+00:00"), ("b", "2000-01-01T00:00:00+00:00")],
+    )
+    conn.commit()
+    conn.close()
+    status = mgr.get_compliance_status()
+    assert status["unidentified_samples"] == 2
+    assert status["pending_approval_samples"] == 2
+    assert status["active_voice_profiles"] == 1
+    assert status["expired_voice_profiles"] == 1
+    assert status["total_persons_in_graph"] == 2
+
+
+def test_storage_retention_delete_batch_uses_created_index(tmp_path):
+    """Пачка retention-DELETE выбирает строки через idx_transcriptions_created."""
+    from src.storage.db import get_reflexio_db
+    from src.storage.ingest_persist import ensure_ingest_tables
+
+    db_path = tmp_path / "r.db"
+    ensure_ingest_tables(db_path)
+    plan = get_reflexio_db(db_path).fetchall(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM transcriptions WHERE created_at < ? LIMIT ?",
+        ("2020-01-01T00:00:00", 5000),
+    )
+    assert "idx_transcriptions_created" in " ".join(row["detail"] for row in plan)
+
+
+def test_storage_retention_cutoff_matches_utc_created_at(tmp_path):
+    """cleanup_transcriptions: cutoff в UTC ISO — граница совпадает с форматом created_at."""
+    from datetime import datetime, timedelta, timezone
+
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    boundary = datetime.now(timezone.utc) - timedelta(days=30)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)",
+        [
+            ("expired", (boundary - timedelta(minutes=5)).isoformat()),
+            ("kept", (boundary + timedelta(minutes=5)).isoformat()),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(db_path)
+    with patch("src.storage.db.get_db", return_value=backend):
+        assert RetentionPolicy(transcription_retention_days=30).cleanup_transcriptions() == 1
+    assert [r[0] for r in backend.conn.execute("SELECT id FROM transcriptions")] == ["kept"]
+
+
+def test_storage_migrate_pg_to_sqlite_matches_sequential_replace():
+    """_pg_to_sqlite: один проход даёт тот же SQL, что цепочка str.replace по всем миграциям."""
+    from src.storage.migrate import _PG_TO_SQLITE_MAP, _pg_to_sqlite
+
+    migrations_dir = Path(__file__).resolve().parent.parent / "src" / "storage" / "migrations"
+    samples = [f.read_text(encoding="utf-8") for f in sorted(migrations_dir.glob("*.sql"))]
+    assert samples
+    samples.append(
+        "id UUID DEFAULT gen_random_uuid(), ts TIMESTAMP WITH TIME ZONE DEFAULT now(), "
+        "t2 TIMESTAMPTZ, n BIGSERIAL, e vector(1536), j JSONB"
+    )
+    for sql in samples:
+        expected = sql
+        for old, new in _PG_TO_SQLITE_MAP.items():
+            expected = expected.replace(old, new)
+        assert _pg_to_sqlite(sql) == expected
+
+
+def test_storage_integrity_event_ids_are_uuid7(tmp_path):
+    """integrity_events.id — UUIDv7: версия 7, вариант RFC, растут со временем."""
+    import time
+    import uuid
+
+    from src.storage.integrity import _uuid7, append_integrity_event
+
+    first = _uuid7()
+    time.sleep(0.002)
+    second = _uuid7()
+    assert first < second
+    parsed = uuid.UUID(second)
+    assert parsed.version == 7
+    assert parsed.variant == uuid.RFC_4122
+    assert abs((parsed.int >> 80) - time.time_ns() // 1_000_000) < 5000
+
+    event_id = append_integrity_event(tmp_path / "r.db", "i", "uploaded", payload_text="x")
+    assert uuid.UUID(event_id).version == 7
+
+
+def test_storage_integrity_hashes_stored_as_blob(tmp_path):
+    """content_hash/prev_hash хранятся сырыми 32 байтами, отчёт — hex; старые hex-цепочки валидны."""
+    import hashlib
+
+    from src.storage.db import get_reflexio_db
+    from src.storage.integrity import append_integrity_event, get_ingest_integrity_report
+
+    db_path = tmp_path / "r.db"
+    append_integrity_event(db_path, "i", "a", payload_bytes=b"1")
+    append_integrity_event(db_path, "i", "b", payload_bytes=b"2")
+    db = get_reflexio_db(db_path)
+    row = db.fetchone(
+        "SELECT typeof(content_hash), length(content_hash), prev_hash FROM integrity_events WHERE stage = 'b'"
+    )
+    assert (row[0], row[1]) == ("blob", 32)
+    assert row[2] == hashlib.sha256(b"1").digest()
+    report = get_ingest_integrity_report(db_path, "i")
+    assert report["events"][1]["prev_hash"] == hashlib.sha256(b"1").hexdigest()
+    assert report["chain_valid"] is True
+
+    legacy = hashlib.sha256(b"old").hexdigest()
+    db.execute(
+        "INSERT INTO integrity_events (id, ingest_id, stage, content_hash, prev_hash, metadata, created_at) "
+        "VALUES ('x', 'legacy', 'a', ?, NULL, '{}', '2020-01-01T00:00:00+00:00')",
+        (legacy,),
+    )
+    append_integrity_event(db_path, "legacy", "b", payload_bytes=b"new")
+    report = get_ingest_integrity_report(db_path, "legacy")
+    assert report["events"][0]["content_hash"] == legacy
+    assert report["events"][1]["prev_hash"] == legacy
+    assert report["chain_valid"] is True
+
+
+def test_storage_retention_reuses_db_connection(tmp_path):
+    """RetentionPolicy: бэкенд БД создаётся один раз, close()/with закрывают соединение."""
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(db_path)
+    with patch("src.storage.db.get_db", return_value=backend) as mock_get_db:
+        with RetentionPolicy(transcription_retention_days=90) as policy:
+            assert policy.cleanup_transcriptions() == 0
+            assert policy.cleanup_transcriptions() == 0
+            assert policy._get_db() is backend
+        assert mock_get_db.call_count == 1
+    assert policy._db is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        backend.conn.execute("SELECT 1")
+
+
+def test_storage_retention_delete_sql_cached():
+    """_delete_batch_sql: текст запроса строится один раз на пару таблица/колонка."""
+    from src.storage.retention_policy import _delete_batch_sql
+
+    sql = _delete_batch_sql("transcriptions", "created_at")
+    assert _delete_batch_sql("transcriptions", "created_at") is sql
+    assert "rowid IN (SELECT rowid FROM transcriptions WHERE created_at < ? LIMIT ?)" in sql
+
+
+def test_storage_retention_delete_sql_validates_identifiers():
+    """_delete_batch_sql: таблица вне whitelist или колонка со спецсимволами — ValueError."""
+    from src.storage.retention_policy import _delete_batch_sql
+
+    with pytest.raises(ValueError):
+        _delete_batch_sql("sqlite_master", "created_at")
+    with pytest.raises(ValueError):
+        _delete_batch_sql("transcriptions", "created_at; DROP TABLE facts")
+
+
+def test_storage_retention_incremental_vacuum_after_delete(tmp_path):
+    """Новая БД — auto_vacuum=INCREMENTAL; после retention-DELETE свободные страницы возвращаются."""
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    backend = SQLiteBackend(db_path)
+    conn = backend.conn
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)",
+        [("x" * 1000, "2020-01-01T00:00:00") for _ in range(500)],
+    )
+    with patch("src.storage.db.get_db", return_value=backend):
+        policy = RetentionPolicy(transcription_retention_days=90)
+        policy.VACUUM_PAGES_PER_RUN = 10_000
+        with patch("src.storage.retention_policy.logger") as m_log:
+            assert policy.cleanup_transcriptions() == 500
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    vacuum_log = next(c for c in m_log.info.call_args_list if c.args == ("incremental_vacuum",))
+    assert vacuum_log.kwargs["freelist_before"] > 0
+    assert vacuum_log.kwargs["freelist_after"] == 0
+
+
+def test_storage_db_auto_vacuum_only_on_new_file(tmp_path):
+    """auto_vacuum=INCREMENTAL ставится при создании файла; существующую БД не трогаем."""
+    import sqlite3
+
+    from src.storage.db import get_connection
+
+    legacy = tmp_path / "legacy.db"
+    sqlite3.connect(legacy).execute("CREATE TABLE t (x)").connection.close()
+    conn = get_connection(legacy)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    conn.close()
+
+    fresh = get_connection(tmp_path / "fresh.db")
+    assert fresh.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    fresh.close()
+
+
+def test_storage_retention_cleanup_all_optimizes_after_delete():
+    """cleanup_all: PRAGMA optimize только если транскрипции действительно удалялись."""
+    from src.storage.retention_policy import RetentionPolicy
+
+    policy = RetentionPolicy(audio_retention_hours=0, digest_retention_days=0)
+    policy._db = MagicMock()
+    with patch.object(policy, "cleanup_transcriptions", return_value=0):
+        policy.cleanup_all()
+    policy._db.conn.execute.assert_not_called()
+
+    with patch.object(policy, "cleanup_transcriptions", return_value=3):
+        assert policy.cleanup_all()["transcriptions"] == 3
+    policy._db.conn.execute.assert_called_once_with("PRAGMA optimize")
+
+    policy._db.conn.execute.side_effect = sqlite3.OperationalError("locked")
+    with patch.object(policy, "cleanup_transcriptions", return_value=1):
+        assert policy.cleanup_all()["transcriptions"] == 1
+
+
+def test_storage_retention_full_purge_uses_truncate(tmp_path):
+    """cleanup_transcriptions: всё старше cutoff или purge_all — один DELETE без WHERE."""
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    backend = SQLiteBackend(db_path)
+    backend.conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    backend.conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)", [(str(i), "2020-01-01") for i in range(4)]
+    )
+    with patch("src.storage.db.get_db", return_value=backend):
+        policy = RetentionPolicy(transcription_retention_days=90)
+        with patch.object(policy, "_delete_in_batches") as batches:
+            assert policy.cleanup_transcriptions() == 4
+        batches.assert_not_called()
+
+        backend.conn.executemany(
+            "INSERT INTO transcriptions VALUES (?, ?)", [("old", "2020-01-01"), ("undated", None)]
+        )
+        assert policy.cleanup_transcriptions() == 1
+        assert [r[0] for r in backend.conn.execute("SELECT id FROM transcriptions")] == ["undated"]
+
+        assert RetentionPolicy(transcription_retention_days=0).cleanup_transcriptions() == 0
+        assert RetentionPolicy(transcription_retention_days=0).cleanup_transcriptions(purge_all=True) == 1
+
+
+def test_storage_retention_cleanup_digests_scandir(tmp_path):
+    """cleanup_digests: старые digest_*.md с .json/.pdf удалены, свежие и чужие файлы — нет."""
+    from src.storage.retention_policy import RetentionPolicy
+
+    digests_dir = tmp_path / "digests"
+    digests_dir.mkdir()
+    for name in [
+        "digest_2020-01-01.md",
+        "digest_2020-01-01.json",
+        "digest_2020-01-01.pdf",
+        "digest_2020-01-02.md",
+        "digest_2999-01-01.md",
+        "digest_2999-01-01.json",
+        "digest_broken.md",
+        "notes_2020-01-01.md",
+    ]:
+        (digests_dir / name).write_text("x")
+
+    policy = RetentionPolicy(digest_retention_days=30)
+    with patch("src.storage.retention_policy.Path", return_value=digests_dir):
+        assert policy.cleanup_digests() == 2
+    assert sorted(p.name for p in digests_dir.iterdir()) == [
+        "digest_2999-01-01.json",
+        "digest_2999-01-01.md",
+        "digest_broken.md",
+        "notes_2020-01-01.md",
+    ]
+
+
+def test_summarizer_deepconf_token_entropy_cached_closed_form():
+    """calculate_token_entropy: замкнутая формула совпадает с поэлементной, повтор — из кэша."""
+    import math
+    from collections import Counter
+
+    from src.summarizer import deepconf
+
+    text = "встреча завтра встреча в офисе завтра утром Встреча"
+    counts = Counter(text.lower().split())
+    total = sum(counts.values())
+    expected = -sum(c / total * math.log2(c / total) for c in counts.values()) / math.log2(len(counts))
+
+    deepconf._token_entropy.cache_clear()
+    assert deepconf.calculate_token_entropy(text) == pytest.approx(expected)
+    assert deepconf.calculate_token_entropy(text) == pytest.approx(expected)
+    assert deepconf._token_entropy.cache_info().hits == 1
+    assert deepconf.calculate_token_entropy("") == 0.0
+    assert deepconf.calculate_token_entropy("да да да") == 0.0
+
+
+def test_summarizer_critic_fast_gate_single_llm_call():
+    """validate_summary(fast_gate): гейт и выбор по эвристикам, LLM-критик один раз на итоговом."""
+    import src.summarizer.critic as critic_mod
+
+    def fake_score(summary, original_text, use_llm=True):
+        base = 0.95 if use_llm else (0.7 if summary == "Refined." else 0.5)
+        return {"confidence_score": base, "token_entropy": 0.1, "use_llm": use_llm}
+
+    with (
+        patch.object(critic_mod, "calculate_confidence_score", side_effect=fake_score) as m_calc,
+        patch.object(critic_mod, "refine_summary", return_value="Refined."),
+    ):
+        result = critic_mod.validate_summary("Bad.", "Original.", confidence_threshold=0.85, fast_gate=True)
+    assert [c.kwargs["use_llm"] for c in m_calc.call_args_list] == [False, False, True]
+    assert m_calc.call_args_list[-1].args[0] == "Refined."
+    assert result["refined"] is True
+    assert result["summary"] == "Refined."
+    assert result["confidence_score"] == 0.95
+    assert result["metrics"]["use_llm"] is True
+
+
+def test_summarizer_critic_good_summary_skips_refine():
+    """Хорошее саммари не уходит в refine ни по умолчанию, ни с fast_gate на эвристиках."""
+    import src.summarizer.critic as critic_mod
+
+    original = " ".join(f"слово{i}" for i in range(100))
+    summary = " ".join(f"слово{i}" for i in range(30))
+    mock_client = MagicMock()
+    mock_client.call.return_value = {
+        "text": '{"factual_consistency": 0.95, "completeness": 0.9, "coherence": 0.95, "conciseness": 0.9}',
+        "error": None,
+    }
+    with (
+        patch("src.summarizer.deepconf.get_llm_client", return_value=mock_client),
+        patch.object(critic_mod, "refine_summary") as m_refine,
+    ):
+        default = critic_mod.validate_summary(summary, original)
+        gated = critic_mod.validate_summary(summary, original, fast_gate=True)
+    m_refine.assert_not_called()
+    assert default["refined"] is False and gated["refined"] is False
+    assert mock_client.call.call_count == 2
+
+
+def test_summarizer_chain_of_density_fused_single_call():
+    """fused=True: один вызов LLM, итерации берутся из JSON-массива."""
+    from src.summarizer.chain_of_density import generate_dense_summary
+
+    mock_client = MagicMock()
+    mock_client.call.return_value = {
+        "text": '```json\n[{"summary": "A", "density_score": 0.3}, '
+        '{"summary": "A B", "density_score": 0.9, "entities": ["B"]}, '
+        '{"summary": "A B C", "density_score": 0.7}]\n```',
+        "error": None,
+    }
+    with patch("src.summarizer.chain_of_density.get_llm_client", return_value=mock_client):
+        result = generate_dense_summary("Some text.", iterations=3, include_emotions=False)
+    assert mock_client.call.call_count == 1
+    prompt = mock_client.call.call_args[0][0]
+    assert "JSON-массив из 3 объектов" in prompt
+    assert "Формат ответа (JSON)" not in prompt
+    assert [it["iteration"] for it in result["iterations"]] == [1, 2, 3]
+    assert result["summary"] == "A B"
+    assert result["entities"] == ["B"]
+
+    mock_client.call.reset_mock()
+    with patch("src.summarizer.chain_of_density.get_llm_client", return_value=mock_client):
+        legacy = generate_dense_summary("Some text.", iterations=2, include_emotions=False, fused=False)
+    assert mock_client.call.call_count == 2
+    assert len(legacy["iterations"]) == 2
+
+
+def test_summarizer_chain_of_density_fused_is_default():
+    """fused=True — осознанный дефолт; fused=False сохраняет прежний цикл и ту же форму результата."""
+    import inspect
+
+    from src.summarizer.chain_of_density import generate_dense_summary
+
+    assert inspect.signature(generate_dense_summary).parameters["fused"].default is True
+
+    mock_client = MagicMock()
+    mock_client.call.return_value = {"text": '{"summary": "A", "density_score": 0.5}', "error": None}
+    with patch("src.summarizer.chain_of_density.get_llm_client", return_value=mock_client):
+        fused = generate_dense_summary("Some text.", iterations=2, include_emotions=False)
+        fused_calls = mock_client.call.call_count
+        legacy = generate_dense_summary("Some text.", iterations=2, include_emotions=False, fused=False)
+    assert fused_calls == 1
+    assert mock_client.call.call_count == 3
+    legacy_prompt = mock_client.call.call_args[0][0]
+    assert "Формат ответа (JSON)" in legacy_prompt
+    assert "JSON-массив" not in legacy_prompt
+    assert set(fused) == set(legacy)
+
+
+def test_utils_json_utils_extract_json_objects():
+    """extract_json_objects: вложенность, скобки в строках, мусор между блоками."""
+    from src.utils.json_utils import extract_json_objects
+
+    text = (
+        'Итерация 1: {"summary": "a {b}", "entities": [{"n": 1}], "x": {"y": {"z": 2}}}\n'
+        'шум {не json} и "кавычка\n'
+        'Итерация 2: {"summary": "esc \\" }", "density_score": 0.5}'
+    )
+    objects = extract_json_objects(text)
+    assert [o["summary"] for o in objects] == ["a {b}", 'esc " }']
+    assert objects[0]["x"]["y"]["z"] == 2
+    assert extract_json_objects("no braces") == []
+
+
+def test_utils_json_utils_extract_json_objects_stray_brace():
+    """Незакрытая «{» в прозе не прячет объект после неё."""
+    from src.utils.json_utils import extract_json_objects
+
+    text = 'Use a {placeholder. Result: {"summary": "x", "density_score": 0.9}'
+    assert extract_json_objects(text) == [{"summary": "x", "density_score": 0.9}]
+    assert extract_json_objects('{"a": 1} и {хвост') == [{"a": 1}]
+
+
+def test_utils_json_utils_extract_json_objects_invalid_outer_span():
+    """Невалидная сбалансированная обёртка — берём вложенные объекты."""
+    from src.utils.json_utils import extract_json_objects
+
+    text = 'Итоги {итерации: {"summary": "A"}, {"summary": "B"} конец} {"summary": "C"}'
+    assert [o["summary"] for o in extract_json_objects(text)] == ["A", "B", "C"]
+
+
+def test_summarizer_deepconf_llm_metrics_wrapped_in_prose():
+    """calculate_confidence_score парсит JSON критика, окружённый текстом."""
+    from src.summarizer.deepconf import calculate_confidence_score
+
+    mock_client = MagicMock()
+    mock_client.call.return_value = {
+        "text": 'Оценка: {"factual_consistency": 1.0, "completeness": 1.0, '
+        '"coherence": 1.0, "conciseness": 1.0, "issues": ["{x}"]} готово',
+        "error": None,
+    }
+    with patch("src.summarizer.deepconf.get_llm_client", return_value=mock_client):
+        result = calculate_confidence_score("Саммари текста.", "Исходный текст.", use_llm=True)
+    assert result["confidence_score"] == pytest.approx(1.0)
+    assert result["issues"] == ["{x}"]
+
+
+def test_summarizer_chain_of_density_client_for_cached():
+    """_client_for создаёт клиент под модель один раз; неизвестная модель → None."""
+    from src.summarizer import chain_of_density as cod
+
+    cod._client_for.cache_clear()
+    with patch("src.llm.providers.OpenAIClient") as openai_cls:
+        first = cod._client_for("gpt-4o-mini")
+        second = cod._client_for("gpt-4o-mini")
+    assert first is second
+    openai_cls.assert_called_once_with(model="gpt-4o-mini")
+    assert cod._client_for("unknown-model") is None
+    cod._client_for.cache_clear()
+
+
+def test_summarizer_emotion_keywords_single_pass():
+    """_fallback_text_analysis: эмоции и sentiment из одного набора совпадений."""
+    from src.summarizer import emotion_analysis as ea
+
+    analyzer = ea.EmotionAnalyzer(method="text")
+    result = analyzer._fallback_text_analysis("Я РАД, всё отлично, но тревожно")
+    assert result["emotions"] == ["радость", "страх"]
+    assert result["sentiment"] == "positive"
+
+    # Путь через автомат: совпадения берутся из iter(), а не из `in`
+    fake = MagicMock()
+    fake.iter.return_value = [(3, "бесит"), (9, "плохо")]
+    with patch.object(ea, "_AUTOMATON", fake):
+        result = analyzer._fallback_text_analysis("...")
+    fake.iter.assert_called_once_with("...")
+    assert result["emotions"] == ["грусть", "злость"]
+    assert result["sentiment"] == "negative"
+
+
+def test_summarizer_emotion_keyword_regex_no_lower():
+    """_find_keywords без автомата: регистр не важен, перекрытия находятся."""
+    from src.summarizer import emotion_analysis as ea
+
+    with patch.object(ea, "_AUTOMATON", None):
+        hits = ea._find_keywords("ОГОнь, ПлОхО и злойОго")
+    assert hits == {"ого", "плохо", "злой"}
+
+
+def test_summarizer_chain_of_density_columns_empty_and_failed_parse():
+    """Ошибка LLM → пустой результат; непарсимый ответ → итерация с текстом как есть."""
+    from src.summarizer.chain_of_density import generate_dense_summary
+
+    mock_client = MagicMock()
+    mock_client.call.return_value = {"text": "", "error": "timeout"}
+    with patch("src.summarizer.chain_of_density.get_llm_client", return_value=mock_client):
+        result = generate_dense_summary("Some text.", iterations=2, include_emotions=False)
+    assert result["summary"] == "" and result["iterations"] == []
+
+    mock_client.call.return_value = {"text": "просто текст", "error": None}
+    with patch("src.summarizer.chain_of_density.get_llm_client", return_value=mock_client):
+        result = generate_dense_summary("Some text.", iterations=2, include_emotions=False)
+    assert result["summary"] == "просто текст"
+    assert result["iterations"] == [
+        {"iteration": 1, "summary": "просто текст", "density_score": 0.0, "entities": [], "key_facts": []}
+    ]
+
+
+def test_storage_supabase_client_memoized_and_connection_ttl():
+    """Клиент создаётся один раз на (url, key); успешная проверка кэшируется по TTL."""
+    from src.storage import supabase_client as sc
+
+    sc._create_client.cache_clear()
+    env = {"SUPABASE_URL": "https://x.supabase.co", "SUPABASE_ANON_KEY": "k"}
+    mock_client = MagicMock()
+    with patch.dict(os.environ, env), patch.object(sc, "HAS_SUPABASE", True), \
+         patch.object(sc, "create_client", create=True, return_value=mock_client) as create, \
+         patch.object(sc, "_last_ok_check", None):
+        assert sc.get_supabase_client() is sc.get_supabase_client() is mock_client
+        create.assert_called_once_with("https://x.supabase.co", "k")
+
+        execute = mock_client.table.return_value.select.return_value.limit.return_value.execute
+        assert sc.test_connection()["status"] == "ok"
+        assert sc.test_connection()["status"] == "ok"
+        assert execute.call_count == 1
+
+        with patch.object(sc, "CONNECTION_CHECK_TTL_SECONDS", 0.0):
+            sc.test_connection()
+        assert execute.call_count == 2
+    sc._create_client.cache_clear()
+
+
+def test_summarizer_deepconf_count_tokens_streaming_matches_split():
+    """Потоковый подсчёт токенов совпадает с Counter(text.lower().split())."""
+    from collections import Counter
+
+    from src.summarizer import deepconf
+
+    text = "Мир  ТЕСТ\tмир\nтест Слово слово " * 3
+    expected = Counter(text.lower().split())
+    assert deepconf._count_tokens(text) == expected
+    with patch.object(deepconf, "_STREAM_TOKENIZE_MIN_CHARS", 0):
+        assert deepconf._count_tokens(text) == expected
+
+
+def test_storage_retention_cleanup_all_runs_fs_jobs_in_pool():
+    """cleanup_all: аудио и дайджесты в пуле потоков, транскрипции — в вызывающем."""
+    import threading
+
+    from src.storage.retention_policy import RetentionPolicy
+
+    policy = RetentionPolicy()
+    threads = {}
+
+    def record(name, value):
+        def run():
+            threads[name] = threading.current_thread()
+            return value
+        return run
+
+    with patch.object(policy, "cleanup_audio", side_effect=record("audio", 2)), \
+         patch.object(policy, "cleanup_digests", side_effect=record("digests", 3)), \
+         patch.object(policy, "cleanup_transcriptions", side_effect=record("transcriptions", 0)):
+        result = policy.cleanup_all()
+    assert result == {"audio": 2, "transcriptions": 0, "digests": 3}
+    assert threads["transcriptions"] is threading.current_thread()
+    assert threads["audio"] is not threading.current_thread()
+    assert threads["digests"] is not threading.current_thread()
+
+
+def test_summarizer_emotion_short_text_skips_llm():
+    """analyze_text: короткий текст не идёт в LLM, длинный обрезается до LLM_MAX_CHARS."""
+    from src.summarizer.emotion_analysis import EmotionAnalyzer
+
+    mock_client = MagicMock()
+    mock_client.call.return_value = {"text": '{"emotions": ["calm"]}', "error": None}
+    analyzer = EmotionAnalyzer(method="text")
+    with patch("src.llm.providers.get_llm_client", return_value=mock_client):
+        short = analyzer.analyze_text("Ура, отлично!")
+        assert mock_client.call.call_count == 0
+        long_result = analyzer.analyze_text("а" * 1500)
+    assert short["method"] == "rule_based"
+    assert long_result["method"] == "llm"
+    prompt = mock_client.call.call_args[0][0]
+    assert "а" * 1000 in prompt and "а" * 1001 not in prompt
+
+
+def test_summarizer_emotion_analyzer_cached_with_client():
+    """analyze_emotions переиспользует анализатор; LLM-клиент запрашивается один раз."""
+    from src.summarizer import emotion_analysis as ea
+
+    ea._get_analyzer.cache_clear()
+    mock_client = MagicMock()
+    mock_client.call.return_value = {"text": '{"emotions": ["calm"]}', "error": None}
+    with patch("src.llm.providers.get_llm_client", return_value=mock_client) as get_client:
+        ea.analyze_emotions("x" * 300)
+        ea.analyze_emotions("y" * 300)
+    assert get_client.call_count == 1
+    assert mock_client.call.call_count == 2
+    assert ea._get_analyzer("text") is ea._get_analyzer("text")
+    ea._get_analyzer.cache_clear()
+
+
+def test_utils_json_utils_json_loads_orjson_and_stdlib():
+    """json_loads: orjson и stdlib дают одно и то же; ошибка — JSONDecodeError."""
+    import json
+
+    from src.utils import json_utils
+
+    assert json_utils.json_loads('{"summary": "ок", "n": [1, 2.5]}') == {"summary": "ок", "n": [1, 2.5]}
+    with pytest.raises(json.JSONDecodeError):
+        json_utils.json_loads("{broken")
+    with patch.object(json_utils, "_orjson", None):
+        assert json_utils.json_loads(b'{"a": 1}') == {"a": 1}
+        with pytest.raises(json.JSONDecodeError):
+            json_utils.json_loads("{broken")
+
+
+def test_summarizer_deepconf_llm_fallback_reuses_heuristics():
+    """Fallback-ветки LLM-пути не пересчитывают эвристики и совпадают с use_llm=False."""
+    from src.summarizer import deepconf
+
+    heuristic = deepconf.calculate_confidence_score("Короткое саммари.", "Длинный исходный текст про всё.", use_llm=False)
+    responses = [{"text": "", "error": "timeout"}, {"text": "не json", "error": None}]
+    for response in responses:
+        client = MagicMock()
+        client.call.return_value = response
+        with patch.object(deepconf, "get_llm_client", return_value=client), \
+             patch.object(deepconf, "_compute_heuristics", wraps=deepconf._compute_heuristics) as heur:
+            result = deepconf.calculate_confidence_score(
+                "Короткое саммари.", "Длинный исходный текст про всё.", use_llm=True
+            )
+        assert heur.call_count == 1
+        assert result == heuristic
+
+
+def test_storage_retention_truncate_keeps_row_written_during_check(tmp_path):
+    """Транскрипция, записанная другим соединением между проверкой и DELETE, не теряется."""
+    import threading
+
+    from src.storage.db import SQLiteBackend
+    from src.storage.retention_policy import RetentionPolicy
+
+    db_path = tmp_path / "reflexio.db"
+    backend = SQLiteBackend(db_path)
+    backend.conn.execute("CREATE TABLE transcriptions (id TEXT, created_at TEXT)")
+    backend.conn.execute("INSERT INTO transcriptions VALUES ('old', '2020-01-01')")
+
+    inserted = threading.Event()
+
+    def ingest():
+        other = sqlite3.connect(db_path, timeout=5)
+        other.execute("INSERT INTO transcriptions VALUES ('new', '2999-01-01')")
+        other.commit()
+        other.close()
+        inserted.set()
+
+    policy = RetentionPolicy(transcription_retention_days=90)
+    original_check = policy._has_rows_to_keep
+    writer = threading.Thread(target=ingest)
+
+    def check_then_race(conn, cutoff):
+        result = original_check(conn, cutoff)
+        writer.start()
+        # Пока проверка и DELETE в одной транзакции, запись ждёт write-lock
+        inserted.wait(0.3)
+        return result
+
+    with patch("src.storage.db.get_db", return_value=backend), \
+         patch.object(policy, "_has_rows_to_keep", side_effect=check_then_race):
+        policy.cleanup_transcriptions()
+    writer.join(5)
+    assert inserted.is_set()
+    ids = [r[0] for r in backend.conn.execute("SELECT id FROM transcriptions")]
+    assert ids == ["new"]
+
+
+def test_storage_embeddings_local_model_defaults_to_torch():
+    """Без LOCAL_EMBEDDINGS_BACKEND модель грузится через torch, без попытки ONNX."""
+    import sys
+    from src.storage import embeddings as emb_mod
+
+    st_mod = MagicMock()
+    env = {k: v for k, v in os.environ.items() if k != "LOCAL_EMBEDDINGS_BACKEND"}
+    with patch.dict(sys.modules, {"sentence_transformers": st_mod}), \
+         patch.dict(os.environ, env, clear=True):
+        emb_mod._load_st_model()
+    st_mod.SentenceTransformer.assert_called_once_with("all-MiniLM-L6-v2")
+
+
+def test_storage_migrate_fetch_table_json_in_rowid_chunks(tmp_path):
+    """_fetch_table_json: таблица читается порциями по rowid, порядок и JSON-колонки сохраняются."""
+    from src.storage import migrate
+
+    conn = sqlite3.connect(str(tmp_path / "r.db"))
+    conn.execute("CREATE TABLE transcriptions (id TEXT, segments TEXT)")
+    conn.executemany(
+        "INSERT INTO transcriptions VALUES (?, ?)",
+        [(str(i), f'[{{"i": {i}}}]') for i in range(5)],
+    )
+    conn.execute("DELETE FROM transcriptions WHERE id = '2'")
+    cursor = MagicMock(wraps=conn.cursor())
+    with patch.object(migrate, "_FETCH_CHUNK_ROWS", 2):
+        rows = migrate._fetch_table_json(cursor, "transcriptions")
+    assert rows == [{"id": str(i), "segments": [{"i": i}]} for i in (0, 1, 3, 4)]
+    # PRAGMA + 2 полные порции + пустая
+    assert cursor.execute.call_count == 4
+    conn.close()
+
+
+def test_storage_schema_drops_redundant_facts_index(tmp_path):
+    """schema.sql на старой БД удаляет idx_facts_transcription, оставляя composite-индекс."""
+    schema = (Path(__file__).resolve().parent.parent / "schema.sql").read_text(encoding="utf-8")
+    conn = sqlite3.connect(str(tmp_path / "old.db"))
+    conn.executescript(schema)
+    conn.execute("CREATE INDEX idx_facts_transcription ON facts(transcription_id)")
+    conn.executescript(schema)
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_facts_transcription" not in names
+    assert "idx_facts_transcription_timestamp" in names
+    conn.close()
+
+
+def test_summarizer_emotion_llm_client_none_not_cached():
+    """_get_llm_client: None (провайдер недоступен) запрашивается повторно, найденный клиент кэшируется."""
+    from src.summarizer.emotion_analysis import EmotionAnalyzer
+
+    analyzer = EmotionAnalyzer(method="text")
+    client = MagicMock()
+    with patch("src.llm.providers.get_llm_client", side_effect=[None, client]) as m_get:
+        assert analyzer._get_llm_client() is None
+        assert analyzer._get_llm_client() is client
+        assert analyzer._get_llm_client() is client
+    assert m_get.call_count == 2